@@ -0,0 +1,72 @@
+import hashlib
+import os
+from typing import Optional
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+
+# Minimum cosine similarity for a cached artifact to count as a hit
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+class SemanticCache:
+    """Maps generation requests to the IDs of artifacts already generated for them.
+
+    Requests are embedded and stored in their own Chroma collection, so a new
+    request that is close enough to an earlier one (same kind, same parameters)
+    can reuse the earlier mindmap, learning module or podcast instead of calling
+    the LLM again.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding: Embeddings,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        collection_name: str = "llm_cache",
+    ):
+        self.threshold = threshold
+        self.store = Chroma(
+            collection_name=collection_name,
+            embedding_function=embedding,
+            persist_directory=persist_directory,
+            collection_metadata={"hnsw:space": "cosine"},
+        )
+
+    @staticmethod
+    def _entry_id(kind: str, query: str, params: dict) -> str:
+        key = "|".join([kind, query.strip().lower(), *(f"{k}={params[k]}" for k in sorted(params))])
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def lookup(self, kind: str, query: str, **params) -> Optional[str]:
+        """Return the artifact ID cached for a similar request, if any.
+
+        `params` must match exactly (e.g. podcast duration); only `query` is
+        compared by similarity.
+        """
+        try:
+            exact = self.store.get(ids=[self._entry_id(kind, query, params)])
+            if exact["ids"]:
+                return exact["metadatas"][0]["artifact_id"]
+
+            conditions = [{"kind": kind}, *({k: v} for k, v in params.items())]
+            where = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+            results = self.store.similarity_search_with_score(query, k=1, filter=where)
+            if results:
+                doc, distance = results[0]
+                # Cosine distance in Chroma is 1 - similarity
+                if 1 - distance >= self.threshold:
+                    return doc.metadata["artifact_id"]
+        except Exception as e:
+            print(f"Semantic cache lookup error: {e}")
+        return None
+
+    def store_artifact(self, kind: str, query: str, artifact_id: str, **params):
+        """Record the artifact generated for a request."""
+        try:
+            self.store.add_texts(
+                [query],
+                metadatas=[{"kind": kind, "artifact_id": artifact_id, **params}],
+                ids=[self._entry_id(kind, query, params)],
+            )
+        except Exception as e:
+            print(f"Semantic cache store error: {e}")
@@ -1,31 +1,58 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from fastapi.responses import Response, StreamingResponse, ORJSONResponse
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 import os
+import asyncio
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
+import pymupdf
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser, JsonOutputParser  
-from langchain_core.runnables import RunnablePassthrough, RunnableBranch
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnablePassthrough
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-import tempfile
+import aiofiles
+import aiofiles.tempfile
 from langchain_core.documents import Document
 import uuid
 from datetime import datetime
 import json
+import orjson
+import sqlite3
 import os.path
 from langchain_chroma import Chroma
 from langchain_core.vectorstores import VectorStore
+from langchain_core.embeddings import Embeddings
 import chromadb
 import shutil
 from elevenlabs import ElevenLabs, Voice
 import io
 import base64
-import requests
+import httpx
+import hashlib
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+try:
+    # Optional Rust splitter, considerably faster on large documents
+    from semantic_text_splitter import TextSplitter as RustTextSplitter
+except ImportError:
+    RustTextSplitter = None
+try:
+    # Optional SQLite vector search extension, used when VECTOR_BACKEND=sqlite-vec
+    import sqlite_vec
+except ImportError:
+    sqlite_vec = None
+from contextlib import asynccontextmanager
+import numpy as np
+from llm_cache import SemanticCache
+from mp3_duration import mp3_file_duration
 
 # Load environment variables
 load_dotenv()
@@ -36,7 +63,51 @@ api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     raise ValueError("Missing OPENAI_API_KEY environment variable")
 
-app = FastAPI(title="Exam Preparation & Learning Tool API")
+# Chat model used for generation; can be changed without a redeploy
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Cheaper, faster model for short utility calls such as titles and mindmap JSON
+OPENAI_UTILITY_MODEL = os.getenv("OPENAI_UTILITY_MODEL", "gpt-4o-mini")
+UTILITY_LLM_KINDS = {"title", "mindmap", "module"}
+
+# Upper bound for a requested max_tokens (gpt-4o-mini's output limit). Each distinct
+# value gets its own cached LLM and chains, so requests can't ask for arbitrary ones.
+MAX_COMPLETION_TOKENS = int(os.getenv("MAX_COMPLETION_TOKENS", "16384"))
+
+# Maximum number of LLM calls in flight per worker, to stay within provider rate limits
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_SEM = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Shared connection pool for OpenAI requests, so calls reuse keep-alive connections
+HTTP_CLIENT = httpx.AsyncClient(limits=httpx.Limits(max_connections=50, max_keepalive_connections=20))
+
+# Largest accepted upload, in bytes
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+
+# Comma-separated queries embedded at startup so the first requests hit the cache
+EMBEDDING_WARMUP_QUERIES = [
+    query.strip() for query in os.getenv("EMBEDDING_WARMUP_QUERIES", "").split(",") if query.strip()
+]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(backfill_metadata_index)
+    if EMBEDDING_WARMUP_QUERIES:
+        await asyncio.to_thread(get_cached_embeddings().warmup, EMBEDDING_WARMUP_QUERIES)
+    writers = [asyncio.create_task(vector_writer()), asyncio.create_task(session_writer())]
+    yield
+    # Flush queued writes before shutting down
+    await VECTOR_WRITE_QUEUE.join()
+    await SESSION_WRITE_QUEUE.join()
+    for writer in writers:
+        writer.cancel()
+    await HTTP_CLIENT.aclose()
+
+app = FastAPI(
+    title="Exam Preparation & Learning Tool API",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # Configure CORS
 app.add_middleware(
@@ -47,15 +118,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses such as Markdown/LaTeX learning materials
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Data models
 class SummaryRequest(BaseModel):
     summary_type: str = "summarize"  # or "elaborate" or "learn"
-    max_tokens: Optional[int] = 1000
+    max_tokens: Optional[int] = Field(1000, ge=1, le=MAX_COMPLETION_TOKENS)
 
 class TextSummaryRequest(BaseModel):
     text: str
     summary_type: str = "summarize"  # or "elaborate" or "learn"
-    max_tokens: Optional[int] = 1000
+    max_tokens: Optional[int] = Field(1000, ge=1, le=MAX_COMPLETION_TOKENS)
 
 class ChatMessage(BaseModel):
     role: str  # "user" or "assistant" or "system"
@@ -149,19 +223,266 @@ MINDMAPS_DIR = "mindmaps"
 LEARNING_MODULES_DIR = "learning_modules"
 PODCASTS_DIR = "podcasts"
 PODCAST_AUDIO_DIR = "podcasts/audio"
+# Audio still being synthesized, outside the publicly served audio directory
+PODCAST_PARTS_DIR = "podcasts/parts"
+METADATA_DB_PATH = os.getenv("METADATA_DB_PATH", "metadata.db")
 
 # Create necessary directories
 for directory in [CHAT_SESSIONS_DIR, VECTOR_DB_DIR, EXAM_PAPERS_DIR, 
-                 MINDMAPS_DIR, LEARNING_MODULES_DIR, PODCASTS_DIR, PODCAST_AUDIO_DIR]:
+                 MINDMAPS_DIR, LEARNING_MODULES_DIR, PODCASTS_DIR, PODCAST_AUDIO_DIR, PODCAST_PARTS_DIR]:
     os.makedirs(directory, exist_ok=True)
 
+# In-memory caching
+class LRUCache:
+    """Thread-safe LRU cache with an optional time-to-live for entries.
+
+    If max_weight is set, the total len() of the cached values is also kept below
+    it, and values larger than max_weight are not cached at all.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, max_weight: Optional[int] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at, weight = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self._weight -= weight
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        weight = len(value) if self.max_weight is not None else 0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._weight -= old[2]
+            if self.max_weight is not None and weight > self.max_weight:
+                return
+            self._data[key] = (value, expires_at, weight)
+            self._weight += weight
+            while len(self._data) > self.maxsize or (
+                self.max_weight is not None and self._weight > self.max_weight
+            ):
+                self._weight -= self._data.popitem(last=False)[1][2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "weight": self._weight,
+                "max_weight": self.max_weight,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+# Cache of generated summaries keyed by (content hash, action)
+RESPONSE_CACHE = LRUCache(maxsize=1000, ttl=3600)
+
+# Cache of extracted PDF text keyed by the hash of the file bytes, bounded by the
+# total number of characters since a single PDF's text can run to tens of megabytes
+PDF_TEXT_CACHE_MAX_CHARS = int(os.getenv("PDF_TEXT_CACHE_MAX_CHARS", str(32 * 1024 * 1024)))
+PDF_TEXT_CACHE = LRUCache(maxsize=128, ttl=3600, max_weight=PDF_TEXT_CACHE_MAX_CHARS)
+
+# Cache of vector store search results keyed by (store generation, query, k)
+SEARCH_CACHE = LRUCache(maxsize=512, ttl=300)
+
+# Bumped on every write to the vector store
+VECTORSTORE_GENERATION = 0
+
+def content_hash(*parts: str) -> str:
+    """Return a stable hash for caching text content, hashing the parts incrementally."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+# Metadata index
+class MetadataIndex:
+    """SQLite index of stored items, so listings don't read every JSON file."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY, title TEXT, created_at TEXT, domain TEXT, message_count INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS exam_papers (
+        id TEXT PRIMARY KEY, title TEXT, subject TEXT, year TEXT, uploaded_at TEXT, data TEXT
+    );
+    CREATE TABLE IF NOT EXISTS mindmaps (
+        id TEXT PRIMARY KEY, title TEXT, subject TEXT, created_at TEXT, data TEXT
+    );
+    CREATE TABLE IF NOT EXISTS learning_modules (
+        id TEXT PRIMARY KEY, title TEXT, subject TEXT, created_at TEXT, data TEXT
+    );
+    CREATE TABLE IF NOT EXISTS podcasts (
+        id TEXT PRIMARY KEY, title TEXT, subject TEXT, created_at TEXT, audio_path TEXT, data TEXT
+    );
+    CREATE TABLE IF NOT EXISTS scans (
+        directory TEXT PRIMARY KEY, scanned_at REAL
+    );
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+
+    def upsert_many(self, table: str, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        columns = list(rows[0])
+        sql = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        with self._lock, self._conn:
+            self._conn.executemany(sql, [tuple(row[column] for column in columns) for row in rows])
+
+    def upsert(self, table: str, row: Dict[str, Any]):
+        self.upsert_many(table, [row])
+
+    def delete(self, table: str, item_id: str):
+        self.delete_many(table, [item_id])
+
+    def delete_many(self, table: str, item_ids):
+        with self._lock, self._conn:
+            self._conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(item_id,) for item_id in item_ids])
+
+    def last_scan(self, directory: str) -> float:
+        """Time of the last completed backfill of a directory, or 0 if it was never scanned."""
+        with self._lock:
+            row = self._conn.execute("SELECT scanned_at FROM scans WHERE directory = ?", (directory,)).fetchone()
+        return row["scanned_at"] if row else 0.0
+
+    def set_last_scan(self, directory: str, scanned_at: float):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO scans (directory, scanned_at) VALUES (?, ?)", (directory, scanned_at))
+
+    def rows(self, table: str, columns: str = "*") -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(f"SELECT {columns} FROM {table} ORDER BY rowid").fetchall()
+
+    def ids(self, table: str) -> set:
+        return {row["id"] for row in self.rows(table, "id")}
+
+METADATA_INDEX = MetadataIndex(METADATA_DB_PATH)
+
+# Columns indexed for each table, besides the id. Tables other than sessions also keep
+# the full JSON in a data column, since their list endpoints return complete items.
+INDEX_COLUMNS = {
+    "sessions": ("title", "created_at", "domain"),
+    "exam_papers": ("title", "subject", "year", "uploaded_at"),
+    "mindmaps": ("title", "subject", "created_at"),
+    "learning_modules": ("title", "subject", "created_at"),
+    "podcasts": ("title", "subject", "created_at", "audio_path"),
+}
+
+def index_row(table: str, model: BaseModel) -> Dict[str, Any]:
+    """Build the metadata index row for a stored model."""
+    row = {"id": model.id}
+    row.update({column: getattr(model, column) for column in INDEX_COLUMNS[table]})
+    if table == "sessions":
+        row["message_count"] = len(model.messages)
+    else:
+        row["data"] = model.model_dump_json()
+    return row
+
+def indexed_json_response(table: str, key: Optional[str] = None) -> Response:
+    """Respond with the stored JSON of every item in an index table, without parsing it.
+
+    The data column already holds each item as serialized by pydantic, so the array
+    is assembled from those strings directly. With key, the array is wrapped in an
+    object under that key.
+    """
+    body = "[" + ",".join(row["data"] for row in METADATA_INDEX.rows(table, "data")) + "]"
+    if key:
+        body = f'{{"{key}":{body}}}'
+    return Response(content=body, media_type="application/json")
+
+def backfill_metadata_index():
+    """Bring the index in line with the JSON files on disk.
+
+    Only files that are not indexed yet or were modified since the previous scan are
+    parsed; rows whose file has been removed are dropped.
+    """
+    indexed_dirs = {
+        "sessions": (CHAT_SESSIONS_DIR, ChatSession),
+        "exam_papers": (EXAM_PAPERS_DIR, ExamPaper),
+        "mindmaps": (MINDMAPS_DIR, MindMap),
+        "learning_modules": (LEARNING_MODULES_DIR, LearningModule),
+        "podcasts": (PODCASTS_DIR, Podcast),
+    }
+    for table, (directory, model_cls) in indexed_dirs.items():
+        known_ids = METADATA_INDEX.ids(table)
+        last_scan = METADATA_INDEX.last_scan(directory)
+        scan_started = time.time()
+        rows = []
+        seen_ids = set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                item_id = entry.name[:-len(".json")]
+                seen_ids.add(item_id)
+                if item_id in known_ids and entry.stat().st_mtime < last_scan:
+                    continue
+                try:
+                    with open(entry.path, "rb") as f:
+                        model = model_cls.model_validate_json(f.read())
+                    if table == "sessions":
+                        # Count the messages journaled since the snapshot too
+                        log_path = get_session_log_path(item_id)
+                        if os.path.exists(log_path):
+                            with open(log_path, "rb") as f:
+                                replay_session_log(model, f.read())
+                except Exception as e:
+                    print(f"Skipping {entry.name} while indexing {table}: {e}")
+                    continue
+                rows.append(index_row(table, model))
+        METADATA_INDEX.upsert_many(table, rows)
+        METADATA_INDEX.delete_many(table, known_ids - seen_ids)
+        METADATA_INDEX.set_last_scan(directory, scan_started)
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files that browsers may cache forever; each podcast gets a new uuid filename."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
 # Mount the podcast audio directory to make files accessible via HTTP
-app.mount("/podcasts/audio", StaticFiles(directory=PODCAST_AUDIO_DIR), name="podcast_audio")
+app.mount("/podcasts/audio", ImmutableStaticFiles(directory=PODCAST_AUDIO_DIR), name="podcast_audio")
 
-# Custom prompt for mathematical content - Summarize
-MATH_SUMMARIZE_PROMPT = """
-You are an expert in mathematics and statistics. Please summarize the following text, 
-paying special attention to mathematical formulas and concepts.
+# System prompt for mathematical content, shared by the summarize, elaborate and learn
+# prompts so the formatting instructions are sent once per request
+MATH_SYSTEM_PROMPT = """
+You are an expert in mathematics and statistics.
 
 IMPORTANT FORMATTING INSTRUCTIONS:
 1. Format ALL mathematical expressions using Markdown-compatible LaTeX syntax:
@@ -173,224 +494,1133 @@ IMPORTANT FORMATTING INSTRUCTIONS:
 5. For cases and conditions, use \\\\begin{{cases}} ... \\\\end{{cases}} with explicit newlines
 6. For matrices, use the proper LaTeX environment: $$\\\\begin{{matrix}} a & b \\\\\\ c & d \\\\end{{matrix}}$$
 7. Verify that all LaTeX expressions are properly balanced with matching delimiters
+"""
+
+# Custom prompt for mathematical content - Summarize
+MATH_SUMMARIZE_PROMPT = """
+Please summarize the following text, paying special attention to mathematical formulas and concepts.
 
 Text: {text}
 
 Summarize:
 """
 
+# Custom prompt for mathematical content - Elaborate
+MATH_ELABORATE_PROMPT = """
+Please elaborate on the following text in detail. Expand on each mathematical concept,
+explain the reasoning behind the formulas and derivations, and add clarifying examples where helpful.
+
+Text: {text}
+
+Elaborate:
+"""
+
+# Custom prompt for mathematical content - Learn
+MATH_LEARN_PROMPT = """
+Please turn the following text into learning material for a student preparing for an exam.
+Introduce the key concepts step by step, explain the important formulas, work through examples,
+and finish with a few practice questions.
+
+Text: {text}
+
+Learning material:
+"""
+
+# Static instructions are sent as module-level system messages and only the per-request
+# parts go in the user message, so the prompt prefix is byte-identical across calls and
+# eligible for OpenAI prompt caching.
+
+# System prompt for chat sessions
+CHAT_SYSTEM_PROMPT = """You are a knowledgeable and patient tutor helping students prepare for their exams.
+Explain concepts clearly and step by step, and point out common mistakes and exam tips where useful.
+Format mathematical expressions with Markdown-compatible LaTeX: $...$ for inline formulas and $$...$$ for display formulas."""
+CHAT_SYSTEM_MESSAGE = SystemMessage(content=CHAT_SYSTEM_PROMPT)
+
+# System prompt for analysing uploaded exam papers; the paper text is sent as the user message
+EXAM_PAPER_PROCESSING_PROMPT = """You are an experienced examiner. Analyse the exam paper provided by the user and report:
+1. The subject and the main topics covered
+2. The types of questions (e.g. multiple choice, short answer, long answer, proofs, numerical problems)
+3. The key concepts, formulas and skills that are tested
+4. The marks distribution across topics, if stated
+5. The overall difficulty and advice on how to prepare for a paper like this
+
+Format mathematical expressions with Markdown-compatible LaTeX."""
+
+MINDMAP_SYSTEM_MESSAGE = SystemMessage(content="""You are an expert educational content designer specializing in creating structured mind maps.
+Your task is to generate a comprehensive mind map structure for the subject the user asks for.
+
+The mind map should:
+1. Have a clear hierarchical structure
+2. Cover the key concepts and their relationships
+3. Be educational and follow a logical learning progression
+4. Include important subtopics, formulas, and principles
+
+Return the mind map as a root node plus a flat list of all other nodes. Each node has an
+id, a label, a short description and the ids of its children; the root node lists the
+ids of the top-level subtopics as its children.
+
+Make sure each node has a unique ID and that parent-child relationships are properly defined.
+Take into account that this will be used by students preparing for exams, so it should be comprehensive but focused on exam-relevant material.""")
+
+LEARNING_MODULE_SYSTEM_MESSAGE = SystemMessage(content="""You are an expert in educational content development. You create comprehensive learning modules for students.
+
+Your learning module should include:
+1. An introduction to the topic
+2. Key concepts clearly explained
+3. Theoretical foundation with proper mathematical notation
+4. Practical examples and applications
+5. Common exam questions and how to approach them
+6. Tips for exam preparation
+
+IMPORTANT FORMATTING INSTRUCTIONS:
+1. Format ALL mathematical expressions using Markdown-compatible LaTeX syntax:
+   - For inline formulas, use single dollar signs: $E=mc^2$
+   - For display/block formulas, use double dollar signs: $$\\sum_{i=1}^{n} i = \\frac{n(n+1)}{2}$$
+2. Ensure all special LaTeX characters are properly escaped with double backslashes
+3. Always use double braces for LaTeX subscripts and superscripts: $x_{i}$ not $x_i$
+4. Use markdown headings (##, ###) to organize the content into clear sections""")
+
+PODCAST_SYSTEM_MESSAGE = SystemMessage(content="""You are an educational podcast creator. You write scripts for podcast episodes.
+
+The podcast should:
+1. Have a clear introduction that hooks the listener
+2. Present key concepts in a logical progression
+3. Explain complex ideas in conversational, accessible language
+4. Include verbal cues for transitions between topics
+5. End with a summary and key takeaways
+
+Remember this is an audio format, so:
+- Avoid references to visual elements
+- Use verbal descriptions for equations (e.g., "the square root of x plus y" instead of "√(x+y)")
+- Use signposting and transitions to guide the listener
+- Maintain a friendly, engaging tone throughout""")
+
+# Chunking for the vector store
+RETRIEVAL_CHUNK_SIZE = 1000
+RETRIEVAL_CHUNK_OVERLAP = 100
+
+# Chunks shorter than this are merged into a neighbour, up to the merged size limit
+MIN_RETRIEVAL_CHUNK_CHARS = 100
+MAX_MERGED_CHUNK_CHARS = 1150
+
+# Set USE_RUST_SPLITTER=1 to chunk with semantic-text-splitter when it is installed
+USE_RUST_SPLITTER = os.getenv("USE_RUST_SPLITTER", "").lower() in ("1", "true", "yes")
+
+RETRIEVAL_TEXT_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=RETRIEVAL_CHUNK_SIZE,
+    chunk_overlap=RETRIEVAL_CHUNK_OVERLAP,
+    length_function=len,
+)
+
+RUST_TEXT_SPLITTER = (
+    RustTextSplitter(RETRIEVAL_CHUNK_SIZE, overlap=RETRIEVAL_CHUNK_OVERLAP)
+    if USE_RUST_SPLITTER and RustTextSplitter is not None
+    else None
+)
+
+def merge_small_chunks(chunks: List[str]) -> List[str]:
+    """Greedily merge chunks that are too short to be useful into their neighbours."""
+    merged: List[str] = []
+    for chunk in chunks:
+        if merged and (
+            len(chunk) < MIN_RETRIEVAL_CHUNK_CHARS or len(merged[-1]) < MIN_RETRIEVAL_CHUNK_CHARS
+        ) and len(merged[-1]) + 1 + len(chunk) <= MAX_MERGED_CHUNK_CHARS:
+            merged[-1] = f"{merged[-1]}\n{chunk}"
+        else:
+            merged.append(chunk)
+    return merged
+
+def split_for_retrieval(text: str) -> List[str]:
+    """Split text into chunks sized for embedding and retrieval."""
+    if RUST_TEXT_SPLITTER is not None:
+        chunks = RUST_TEXT_SPLITTER.chunks(text)
+    else:
+        chunks = RETRIEVAL_TEXT_SPLITTER.split_text(text)
+    return merge_small_chunks(chunks)
+
+def split_documents_for_retrieval(documents: List[Document]) -> List[Document]:
+    """Split documents into retrieval chunks, copying each document's metadata to its chunks."""
+    return [
+        Document(page_content=chunk, metadata=dict(document.metadata))
+        for document in documents
+        for chunk in split_for_retrieval(document.page_content)
+    ]
+
+# Cache misses are embedded in requests of this many texts, with up to
+# EMBEDDING_MAX_CONCURRENCY requests in flight
+EMBEDDING_BATCH_SIZE = 96
+EMBEDDING_MAX_CONCURRENCY = 8
+
+@functools.lru_cache(maxsize=1)
+def get_embedding_pool() -> ThreadPoolExecutor:
+    """Get the shared thread pool used for concurrent embedding requests."""
+    return ThreadPoolExecutor(max_workers=EMBEDDING_MAX_CONCURRENCY)
+
 # Vector database and embedding functions
+class CachedEmbeddings(Embeddings):
+    """OpenAI embeddings with an in-memory LRU cache keyed by the SHA-256 of the text."""
+
+    def __init__(self, embeddings: Embeddings, maxsize: int = 1000, ttl: Optional[float] = 3600):
+        self.embeddings = embeddings
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            # float32 halves the memory of the float64 list returned by the API
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            self.cache.set(key, vector)
+        return vector.tolist()
+
+    def _lookup(self, texts: List[str]):
+        """Return the cache keys and cached vectors (None on a miss) of texts, and the
+        batches of texts to embed: unique misses in order of first appearance."""
+        keys = [self._key(text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing_texts = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing_texts.setdefault(key, text)
+        missing = list(missing_texts.items())
+        batches = [
+            missing[start:start + EMBEDDING_BATCH_SIZE]
+            for start in range(0, len(missing), EMBEDDING_BATCH_SIZE)
+        ]
+        return keys, vectors, batches
+
+    def _merge(self, keys, vectors, batches, embedded) -> List[List[float]]:
+        """Cache the newly embedded batches and fill them in for the misses."""
+        computed = {}
+        for batch, batch_vectors in zip(batches, embedded):
+            for (key, _), vector in zip(batch, batch_vectors):
+                computed[key] = np.asarray(vector, dtype=np.float32)
+                self.cache.set(key, computed[key])
+        return [
+            (computed[key] if vector is None else vector).tolist()
+            for key, vector in zip(keys, vectors)
+        ]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, batches = self._lookup(texts)
+        # Embed the batches concurrently rather than one request after another
+        embedded = get_embedding_pool().map(
+            lambda batch: self.embeddings.embed_documents([text for _, text in batch]),
+            batches,
+        )
+        return self._merge(keys, vectors, batches, embedded)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, batches = self._lookup(texts)
+        # Same batching as embed_documents, but on the event loop with the async client
+        semaphore = asyncio.Semaphore(EMBEDDING_MAX_CONCURRENCY)
+
+        async def embed_batch(batch):
+            async with semaphore:
+                return await self.embeddings.aembed_documents([text for _, text in batch])
+
+        embedded = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        return self._merge(keys, vectors, batches, embedded)
+
+    def warmup(self, queries: List[str]):
+        """Pre-populate the cache with common queries."""
+        for query in queries:
+            try:
+                self.embed_query(query)
+            except Exception as e:
+                print(f"Embedding warmup error: {e}")
+
+@functools.lru_cache(maxsize=1)
+def get_cached_embeddings() -> CachedEmbeddings:
+    """Return the process-wide cached embeddings model."""
+    return CachedEmbeddings(OpenAIEmbeddings())
+
 def get_embeddings_model():
-    return OpenAIEmbeddings()
+    return get_cached_embeddings()
+
+@functools.lru_cache(maxsize=1)
+def get_semantic_cache() -> SemanticCache:
+    """Return the cache mapping generation requests to previously generated artifacts."""
+    return SemanticCache(VECTOR_DB_DIR, get_cached_embeddings())
+
+def artifact_cache_request(subject: str, topic: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+    """Split a generation request into the text compared by similarity and the params matched exactly.
+
+    Short related phrases embed very close together, so only the topic is compared
+    by similarity; the normalized subject, and whether a topic was given, must match.
+    """
+    subject = " ".join(subject.lower().split())
+    topic = " ".join((topic or "").split())
+    return topic or subject, {"subject": subject, "has_topic": bool(topic)}
+
+async def lookup_cached_artifact(kind: str, subject: str, topic: Optional[str], loader, **params):
+    """Load a previously generated artifact for a similar request, if one exists."""
+    query, request_params = artifact_cache_request(subject, topic)
+    artifact_id = await asyncio.to_thread(
+        get_semantic_cache().lookup, kind, query, **request_params, **params
+    )
+    if artifact_id is None:
+        return None
+    # The file may have been removed since it was cached; regenerate in that case
+    return await loader(artifact_id)
+
+async def cache_artifact(kind: str, subject: str, topic: Optional[str], artifact_id: str, **params):
+    query, request_params = artifact_cache_request(subject, topic)
+    await asyncio.to_thread(
+        get_semantic_cache().store_artifact, kind, query, artifact_id, **request_params, **params
+    )
+
+# Vector store backend: "chroma" (default) or "sqlite-vec". Existing data is not
+# migrated between backends, so switching starts from an empty index.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+SQLITE_VEC_PATH = os.getenv("SQLITE_VEC_PATH", "vectors.db")
+
+# Dimension of the OpenAI embeddings stored in sqlite-vec
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+
+class SqliteVecStore(VectorStore):
+    """Vector store backed by a sqlite-vec vec0 table, with documents in a regular table."""
+
+    def __init__(self, path: str, embedding: Embeddings, dim: int = EMBEDDING_DIM):
+        if sqlite_vec is None:
+            raise RuntimeError("sqlite-vec is not installed")
+        self._embedding = embedding
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.enable_load_extension(True)
+        sqlite_vec.load(self._conn)
+        self._conn.enable_load_extension(False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vec_documents (id INTEGER PRIMARY KEY, content TEXT, metadata TEXT)"
+            )
+            self._conn.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS vec_chunks USING vec0(embedding float[{dim}] distance_metric=cosine)"
+            )
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_embeddings(
+        self, texts: List[str], embeddings: List[List[float]], metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> List[str]:
+        """Store texts with precomputed embeddings."""
+        metadatas = metadatas or [{} for _ in texts]
+        ids = []
+        with self._lock, self._conn:
+            for text, vector, metadata in zip(texts, embeddings, metadatas):
+                cursor = self._conn.execute(
+                    "INSERT INTO vec_documents (content, metadata) VALUES (?, ?)",
+                    (text, orjson.dumps(metadata).decode()),
+                )
+                self._conn.execute(
+                    "INSERT INTO vec_chunks (rowid, embedding) VALUES (?, ?)",
+                    (cursor.lastrowid, sqlite_vec.serialize_float32(vector)),
+                )
+                ids.append(str(cursor.lastrowid))
+        return ids
+
+    def add_texts(self, texts, metadatas: Optional[List[Dict[str, Any]]] = None, **kwargs) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT d.content, d.metadata
+                FROM (
+                    SELECT rowid, distance FROM vec_chunks
+                    WHERE embedding MATCH ? AND k = ?
+                ) AS v
+                JOIN vec_documents AS d ON d.id = v.rowid
+                ORDER BY v.distance
+                """,
+                (sqlite_vec.serialize_float32(embedding), k),
+            ).fetchall()
+        return [Document(page_content=content, metadata=orjson.loads(metadata)) for content, metadata in rows]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k=k)
+
+    @classmethod
+    def from_texts(cls, texts, embedding: Embeddings, metadatas=None, path: str = SQLITE_VEC_PATH, **kwargs):
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas)
+        return store
+
+# Opened once per process; reopening Chroma reloads its index from disk
+_VECTORSTORE: Optional[VectorStore] = None
+_VECTORSTORE_LOCK = threading.Lock()
 
 def get_or_create_vectorstore() -> VectorStore:
     """Get or create the vector store for semantic search."""
+    global _VECTORSTORE
+    if _VECTORSTORE is not None:
+        return _VECTORSTORE
+    
+    with _VECTORSTORE_LOCK:
+        if _VECTORSTORE is not None:
+            return _VECTORSTORE
+        try:
+            embeddings = get_cached_embeddings()
+            if VECTOR_BACKEND == "sqlite-vec":
+                try:
+                    _VECTORSTORE = SqliteVecStore(SQLITE_VEC_PATH, embeddings)
+                    return _VECTORSTORE
+                except Exception as e:
+                    print(f"sqlite-vec unavailable, falling back to Chroma: {e}")
+            
+            # Check if vectorstore exists
+            if os.path.exists(VECTOR_DB_DIR) and len(os.listdir(VECTOR_DB_DIR)) > 0:
+                _VECTORSTORE = Chroma(persist_directory=VECTOR_DB_DIR, embedding_function=embeddings)
+            else:
+                # Create a new vectorstore
+                _VECTORSTORE = Chroma.from_documents(
+                    documents=[Document(page_content="Initial document to create the database")],
+                    embedding=embeddings,
+                    persist_directory=VECTOR_DB_DIR
+                )
+            return _VECTORSTORE
+        except Exception as e:
+            print(f"Vector store error: {e}")
+            # Not cached, so the next call retries
+            return None
+
+# Large documents are written to Chroma in batches rather than one huge insert
+VECTOR_ADD_BATCH_SIZE = 500
+
+def add_documents_batched(
+    vectorstore: VectorStore, documents: List[Document], embeddings: Optional[List[List[float]]] = None
+):
+    """Add documents to the vector store in batches of VECTOR_ADD_BATCH_SIZE.
+
+    For Chroma and sqlite-vec the embeddings are computed up front with the cached
+    embedder, unless passed in, and written straight to the store, skipping its own
+    embedding pass.
+    """
+    global VECTORSTORE_GENERATION
+    if not documents:
+        return
     try:
-        embeddings = OpenAIEmbeddings()
-        # Check if vectorstore exists
-        if os.path.exists(VECTOR_DB_DIR) and len(os.listdir(VECTOR_DB_DIR)) > 0:
-            return Chroma(persist_directory=VECTOR_DB_DIR, embedding_function=embeddings)
-        
-        # Create a new vectorstore
-        vectorstore = Chroma.from_documents(
-            documents=[Document(page_content="Initial document to create the database")],
-            embedding=embeddings,
-            persist_directory=VECTOR_DB_DIR
-        )
-        return vectorstore
-    except Exception as e:
-        print(f"Vector store error: {e}")
-        # Return None or fallback solution
-        return None
+        if not isinstance(vectorstore, (Chroma, SqliteVecStore)):
+            for start in range(0, len(documents), VECTOR_ADD_BATCH_SIZE):
+                vectorstore.add_documents(documents[start:start + VECTOR_ADD_BATCH_SIZE])
+            return
+    
+        texts = [document.page_content for document in documents]
+        if embeddings is None:
+            embeddings = get_cached_embeddings().embed_documents(texts)
+        # Chroma rejects None metadata values
+        metadatas = [
+            {key: value for key, value in document.metadata.items() if value is not None}
+            for document in documents
+        ]
+    
+        for start in range(0, len(documents), VECTOR_ADD_BATCH_SIZE):
+            end = start + VECTOR_ADD_BATCH_SIZE
+            if isinstance(vectorstore, SqliteVecStore):
+                vectorstore.add_embeddings(texts[start:end], embeddings[start:end], metadatas[start:end])
+                continue
+            vectorstore._collection.add(
+                ids=[str(uuid.uuid4()) for _ in texts[start:end]],
+                embeddings=embeddings[start:end],
+                documents=texts[start:end],
+                metadatas=metadatas[start:end],
+            )
+    finally:
+        # Bumped once the documents are in the store, so a search made while they
+        # were being written can't cache results that miss them; a partial write
+        # changes the store too
+        VECTORSTORE_GENERATION += 1
+
+# Vector store writes are queued and applied by a single background task, so
+# requests don't wait on embedding and Chroma sees batched, sequential writes
+VECTOR_WRITE_QUEUE: asyncio.Queue = asyncio.Queue()
+
+def queue_vector_documents(documents: List[Document]):
+    """Queue documents to be added to the vector store in the background."""
+    if documents:
+        VECTOR_WRITE_QUEUE.put_nowait(documents)
+
+async def vector_writer():
+    """Apply queued vector store writes, merging whatever is waiting into one batch."""
+    while True:
+        batch = await VECTOR_WRITE_QUEUE.get()
+        taken = 1
+        while len(batch) < VECTOR_ADD_BATCH_SIZE and not VECTOR_WRITE_QUEUE.empty():
+            batch = batch + VECTOR_WRITE_QUEUE.get_nowait()
+            taken += 1
+        try:
+            vectorstore = await asyncio.to_thread(get_or_create_vectorstore)
+            if vectorstore:
+                embeddings = None
+                if isinstance(vectorstore, (Chroma, SqliteVecStore)):
+                    # Embed with concurrent async requests; only the store write needs a thread
+                    embeddings = await get_cached_embeddings().aembed_documents(
+                        [document.page_content for document in batch]
+                    )
+                await asyncio.to_thread(add_documents_batched, vectorstore, batch, embeddings)
+        except Exception as e:
+            print(f"Error adding to vector store: {e}")
+        finally:
+            for _ in range(taken):
+                VECTOR_WRITE_QUEUE.task_done()
 
-def add_to_vectorstore(text: str, metadata: Dict[str, Any] = None):
+async def add_to_vectorstore(text: str, metadata: Dict[str, Any] = None):
     """Add text to the vector store for future retrieval."""
     if not text.strip():
         return
     
     try:    
-        vectorstore = get_or_create_vectorstore()
-        if not vectorstore:
-            return
-            
-        # Split text into chunks for better retrieval
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100,
-            length_function=len,
-        )
-        
         # Add metadata if none provided
         if metadata is None:
             metadata = {"source": "chat", "timestamp": datetime.now().isoformat()}
             
-        chunks = text_splitter.create_documents(
-            [text], 
-            metadatas=[metadata] * (len(text) // 900 + 1)  # Estimate chunks
-        )
+        # Split text into chunks for better retrieval
+        chunks = [
+            Document(page_content=chunk, metadata=metadata)
+            for chunk in await asyncio.to_thread(split_for_retrieval, text)
+        ]
         
         # Add to vector store
-        vectorstore.add_documents(chunks)
+        queue_vector_documents(chunks)
     except Exception as e:
         print(f"Error adding to vector store: {e}")
 
+def copy_documents(documents: List[Document]) -> List[Document]:
+    """Copy documents so callers cannot mutate cached results."""
+    return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in documents]
+
+# Queries at least this similar to a recently searched one reuse its results
+SEMANTIC_SEARCH_THRESHOLD = float(os.getenv("SEMANTIC_SEARCH_THRESHOLD", "0.95"))
+
+class SemanticSearchCache:
+    """Recent search results indexed by their normalized query embeddings.
+
+    A query close enough to a cached one, searched with the same k against the same
+    vector store generation, reuses that query's results. Like SEARCH_CACHE, entries
+    expire after ttl seconds, since other workers can write to the store without
+    changing this process's generation.
+    """
+
+    def __init__(self, maxsize: int = 256, threshold: float = SEMANTIC_SEARCH_THRESHOLD, ttl: float = 300):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = None
+        self._vectors: Optional[np.ndarray] = None
+        self._ks = np.zeros(maxsize, dtype=np.int64)
+        self._expires = np.zeros(maxsize, dtype=np.float64)
+        self._entries: List[List[Document]] = []
+        self._next = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, generation: int, k: int, vector) -> Optional[List[Document]]:
+        with self._lock:
+            if generation == self._generation and self._entries:
+                count = len(self._entries)
+                similarities = self._vectors[:count] @ self._normalize(vector)
+                similarities[self._ks[:count] != k] = -np.inf
+                similarities[self._expires[:count] <= time.monotonic()] = -np.inf
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    return copy_documents(self._entries[best])
+            self.misses += 1
+            return None
+
+    def set(self, generation: int, k: int, vector, documents: List[Document]):
+        vector = self._normalize(vector)
+        with self._lock:
+            if generation != self._generation:
+                # Results from an older store generation are stale
+                self._generation = generation
+                self._entries = []
+                self._next = 0
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+            slot = self._next
+            self._vectors[slot] = vector
+            self._ks[slot] = k
+            self._expires[slot] = time.monotonic() + self.ttl
+            if slot < len(self._entries):
+                self._entries[slot] = copy_documents(documents)
+            else:
+                self._entries.append(copy_documents(documents))
+            self._next = (slot + 1) % self.maxsize
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+SEMANTIC_SEARCH_CACHE = SemanticSearchCache()
+
 def search_vectorstore(query: str, k: int = 3) -> List[Document]:
     """Search the vector store for relevant documents."""
+    # The generation is part of the key, so writes to the store invalidate older results
+    generation = VECTORSTORE_GENERATION
+    cache_key = (generation, query, k)
+    cached = SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        return copy_documents(cached)
+    
     try:
         vectorstore = get_or_create_vectorstore()
         if vectorstore:
-            return vectorstore.similarity_search(query, k=k)
+            # Embed once and reuse the vector for both the semantic lookup and the search
+            query_vector = get_cached_embeddings().embed_query(query)
+            results = SEMANTIC_SEARCH_CACHE.get(generation, k, query_vector)
+            if results is None:
+                results = vectorstore.similarity_search_by_vector(query_vector, k=k)
+                SEMANTIC_SEARCH_CACHE.set(generation, k, query_vector, results)
+            SEARCH_CACHE.set(cache_key, copy_documents(results))
+            return results
         return []
     except Exception as e:
         print(f"Search error: {e}")
         return []
 
+def build_context(documents: List[Document]) -> Tuple[str, List[str]]:
+    """Join retrieved documents into prompt context and collect exam questions in one pass."""
+    context_buf = io.StringIO()
+    exam_questions = []
+    for n, doc in enumerate(documents):
+        if n:
+            context_buf.write("\n\n")
+        context_buf.write(doc.page_content)
+        if doc.metadata.get("source") == "exam_paper":
+            exam_questions.append(doc.page_content)
+    return context_buf.getvalue(), exam_questions
+
 # PDF and text processing functions
+
+# PDFs with more pages than this are extracted in parallel worker processes
+PARALLEL_PDF_PAGE_THRESHOLD = 50
+
+# Each web worker has its own PDF pool, so the CPUs are split between them
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+PDF_POOL_WORKERS = max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+
+@functools.lru_cache(maxsize=1)
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool used for CPU-bound PDF parsing."""
+    return ProcessPoolExecutor(max_workers=PDF_POOL_WORKERS)
+
+def join_page_text(pdf: pymupdf.Document, page_numbers) -> str:
+    """Concatenate the text of the given pages of an open PDF.
+
+    Pages are written to the buffer one at a time, so only one page's text is
+    held alongside the result instead of a list of every page.
+    """
+    buf = io.StringIO()
+    for n, page_number in enumerate(page_numbers):
+        if n:
+            buf.write("\n\n")
+        buf.write(pdf[page_number].get_text("text"))
+    return buf.getvalue()
+
+def extract_page_range(file_path: str, start: int, end: int) -> str:
+    """Extract the text of pages [start, end) of a PDF file."""
+    with pymupdf.open(file_path) as pdf:
+        return join_page_text(pdf, range(start, end))
+
 def process_pdf(file_path: str) -> str:
     """Process PDF file and return extracted text."""
-    loader = PyPDFLoader(file_path)
-    pages = loader.load()
-    text = " ".join([page.page_content for page in pages])
-    return text
+    # PyMuPDF is a native parser and much faster than pure-Python PDF loaders
+    with pymupdf.open(file_path) as pdf:
+        page_count = pdf.page_count
+    
+    # Text extraction holds the GIL, so it always runs in worker processes: small PDFs
+    # in a single worker, large ones split into one page range per pool worker in parallel
+    workers = 1 if page_count <= PARALLEL_PDF_PAGE_THRESHOLD else PDF_POOL_WORKERS
+    step = max(1, -(-page_count // workers))
+    pool = get_pdf_pool()
+    futures = [
+        pool.submit(extract_page_range, file_path, start, min(start + step, page_count))
+        for start in range(0, page_count, step)
+    ]
+    return "\n\n".join(future.result() for future in futures)
+
+def load_pdf_documents(file_path: str) -> List[Document]:
+    """Load a PDF as one Document per page, with the page number in the metadata."""
+    with pymupdf.open(file_path) as pdf:
+        return [
+            Document(
+                page_content=page.get_text("text"),
+                metadata={"source": file_path, "page": i},
+            )
+            for i, page in enumerate(pdf)
+        ]
+
+def load_and_split_pdf(file_path: str) -> Tuple[List[Document], List[Document]]:
+    """Load a PDF's pages and split them into retrieval chunks, in one pool task."""
+    pages = load_pdf_documents(file_path)
+    return pages, split_documents_for_retrieval(pages)
+
+# Chunking for map-reduce summaries. Every chunk costs one LLM call, so chunks are
+# sized well within the model context and only overlap enough to keep sentences intact.
+SUMMARY_CHUNK_SIZE = 8000
+SUMMARY_CHUNK_OVERLAP = 200
+
+# Built once and shared; the splitter holds no per-call state
+SUMMARY_TEXT_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=SUMMARY_CHUNK_SIZE,
+    chunk_overlap=SUMMARY_CHUNK_OVERLAP,
+    length_function=len,
+)
 
 def split_text(text: str) -> List[Document]:
     """Split text into chunks for processing."""
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000,
-        chunk_overlap=200,
-        length_function=len,
+    # Text that fits in a single chunk doesn't need a splitter pass
+    if len(text) <= SUMMARY_CHUNK_SIZE:
+        return [Document(page_content=text)]
+    
+    return SUMMARY_TEXT_SPLITTER.create_documents([text])
+
+@functools.lru_cache(maxsize=16)
+def get_llm(kind: str = "chat", max_tokens: Optional[int] = None):
+    """Get the shared language model instance for a kind of call and completion token limit."""
+    return ChatOpenAI(
+        temperature=0,
+        model=OPENAI_UTILITY_MODEL if kind in UTILITY_LLM_KINDS else OPENAI_MODEL,
+        max_tokens=max_tokens,
+        max_retries=2,
+        http_async_client=HTTP_CLIENT,
     )
-    return text_splitter.create_documents([text])
 
-def get_llm():
-    """Get the language model."""
-    return ChatOpenAI(temperature=0, model_name="gpt-4")
+@functools.lru_cache(maxsize=8)
+def get_chains(max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """Get the summary chains keyed by action.
 
-def get_conditional_chain():
-    """Get a conditional chain that branches based on the action."""
-    llm = get_llm()
+    The chains are built once per token limit on first use and shared across requests.
+    """
+    llm = get_llm(max_tokens=max_tokens)
     
     # Create prompts
-    summarize_prompt = ChatPromptTemplate.from_template(MATH_SUMMARIZE_PROMPT)
-    elaborate_prompt = ChatPromptTemplate.from_template(MATH_ELABORATE_PROMPT)
-    learn_prompt = ChatPromptTemplate.from_template(MATH_LEARN_PROMPT)
-    
-    # Create the individual chains
-    summarize_chain = summarize_prompt | llm | StrOutputParser()
-    elaborate_chain = elaborate_prompt | llm | StrOutputParser()
-    learn_chain = learn_prompt | llm | StrOutputParser()
+    summarize_prompt = ChatPromptTemplate.from_messages([("system", MATH_SYSTEM_PROMPT), ("human", MATH_SUMMARIZE_PROMPT)])
+    elaborate_prompt = ChatPromptTemplate.from_messages([("system", MATH_SYSTEM_PROMPT), ("human", MATH_ELABORATE_PROMPT)])
+    learn_prompt = ChatPromptTemplate.from_messages([("system", MATH_SYSTEM_PROMPT), ("human", MATH_LEARN_PROMPT)])
     
-    # Create a branch that selects the appropriate chain based on the action
-    branch = RunnableBranch(
-        (lambda x: x["action"] == "summarize", summarize_chain),
-        (lambda x: x["action"] == "elaborate", elaborate_chain),
-        (lambda x: x["action"] == "learn", learn_chain),
-        # Default case
-        summarize_chain
+    return {
+        "summarize": summarize_prompt | llm | StrOutputParser(),
+        "elaborate": elaborate_prompt | llm | StrOutputParser(),
+        "learn": learn_prompt | llm | StrOutputParser(),
+    }
+
+def get_chain(action: str, max_tokens: Optional[int] = None):
+    """Get the chain for an action, defaulting to summarize."""
+    chains = get_chains(max_tokens)
+    return chains.get(action, chains["summarize"])
+
+@functools.lru_cache(maxsize=1)
+def get_title_chain():
+    """Get the chain that names a chat session from its first message."""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "Generate a short, concise title (maximum 6 words) for a conversation that starts with this message. Return ONLY the title with no additional text, quotes, or punctuation."),
+        ("user", "{message}")
+    ])
+    return prompt | get_llm("title") | StrOutputParser()
+
+class MindMapNodeSchema(BaseModel):
+    id: str
+    label: str
+    description: str
+    children: List[str]
+
+# Mindmap shape requested from the model. Strict structured outputs need every field
+# to be required and do not allow free-form dict keys, so nodes are a list here.
+class MindMapSchema(BaseModel):
+    root_node: MindMapNodeSchema
+    nodes: List[MindMapNodeSchema]
+
+@functools.lru_cache(maxsize=1)
+def get_mindmap_llm():
+    """Get the model used for mindmaps, constrained to MindMapSchema."""
+    return get_llm("mindmap").with_structured_output(
+        MindMapSchema, method="json_schema", strict=True, include_raw=True
     )
-    
-    return branch
 
-def process_documents(docs: List[Document], action: str) -> str:
-    """Process documents and generate summary/elaboration/learning materials."""
-    # Combine documents into a single text
-    full_text = " ".join([doc.page_content for doc in docs])
+@functools.lru_cache(maxsize=1)
+def get_exam_analysis_chain():
+    """Get the chain that analyses the text of an exam paper."""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", EXAM_PAPER_PROCESSING_PROMPT),
+        ("human", "Exam paper:\n\n{text}")
+    ])
+    return prompt | get_llm() | StrOutputParser()
+
+# Maximum number of chunks sent to the LLM at the same time for one document
+MAP_CONCURRENCY = 8
+
+async def stream_documents(
+    docs: List[Document], action: str, max_tokens: Optional[int] = None
+) -> AsyncIterator[str]:
+    """Stream the summary/elaboration/learning materials for documents as they are generated."""
+    # Reuse a previous result for the same content, action and token limit
+    cache_key = f"{content_hash(*(doc.page_content for doc in docs))}:{action}:{max_tokens}"
+    cached = RESPONSE_CACHE.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
     
-    # Get the conditional chain
-    chain = get_conditional_chain()
+    # Get the chain for the selected action
+    chain = get_chain(action, max_tokens)
+    parts = []
     
-    # Process text with the appropriate chain
-    return chain.invoke({
-        "text": full_text,
-        "action": action
-    })
+    if len(docs) == 1:
+        async with LLM_SEM:
+            async for token in chain.astream({"text": docs[0].page_content}):
+                parts.append(token)
+                yield token
+    else:
+        # Map: process the chunks concurrently so each prompt stays within the context window
+        semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+        
+        async def process_chunk(doc: Document) -> str:
+            async with semaphore, LLM_SEM:
+                return await chain.ainvoke({"text": doc.page_content})
+        
+        tasks = [asyncio.create_task(process_chunk(doc)) for doc in docs]
+        try:
+            if action == "summarize":
+                # Reduce: condense the partial summaries into a single summary
+                partial_results = await asyncio.gather(*tasks)
+                async with LLM_SEM:
+                    async for token in chain.astream({"text": "\n\n".join(partial_results)}):
+                        parts.append(token)
+                        yield token
+            else:
+                # Elaborations and learning materials are kept section by section,
+                # emitted in document order as soon as each one is ready
+                for i, task in enumerate(tasks):
+                    section = ("\n\n" if i else "") + await task
+                    parts.append(section)
+                    yield section
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    RESPONSE_CACHE.set(cache_key, "".join(parts))
+
+async def process_documents(docs: List[Document], action: str, max_tokens: Optional[int] = None) -> str:
+    """Process documents and generate summary/elaboration/learning materials."""
+    return "".join([part async for part in stream_documents(docs, action, max_tokens)])
+
+def sse_event(data: Dict[str, Any]) -> str:
+    """Format a payload as a server-sent event."""
+    return f"data: {json.dumps(data)}\n\n"
+
+async def stream_summary_events(
+    docs: List[Document], action: str, max_tokens: Optional[int] = None
+) -> AsyncIterator[str]:
+    """Stream generated text for documents as server-sent events."""
+    try:
+        async for part in stream_documents(docs, action, max_tokens):
+            yield sse_event({"delta": part})
+        yield sse_event({"done": True})
+    except Exception as e:
+        print(f"Streaming error: {e}")
+        yield sse_event({"error": str(e)})
 
-def process_text(text: str, action: str) -> str:
+async def process_text(text: str, action: str, max_tokens: Optional[int] = None) -> str:
     """Process text directly and generate summary/elaboration/learning materials."""
     # Split text into chunks
     docs = split_text(text)
     
     # Process documents
-    return process_documents(docs, action)
+    return await process_documents(docs, action, max_tokens)
+
+# JSON persistence helpers. Models are encoded and decoded by pydantic-core directly
+# to and from bytes, without building an intermediate dict.
+
+# Stored JSON is compact; set APP_DEBUG_JSON to pretty-print it for inspection
+APP_DEBUG_JSON = os.getenv("APP_DEBUG_JSON", "").lower() in ("1", "true", "yes")
+
+@functools.lru_cache(maxsize=None)
+def json_adapter(model_cls) -> TypeAdapter:
+    return TypeAdapter(model_cls)
+
+async def write_json_model(file_path: str, model: BaseModel):
+    """Serialize a model to a JSON file, as compact JSON in a single write."""
+    async with aiofiles.open(file_path, "wb") as f:
+        await f.write(json_adapter(type(model)).dump_json(model, indent=2 if APP_DEBUG_JSON else None))
+
+async def read_json_model(file_path: str, model_cls):
+    """Load a model from a JSON file written by write_json_model."""
+    async with aiofiles.open(file_path, "rb") as f:
+        return model_cls.model_validate_json(await f.read())
 
 # Chat session management functions
 def get_session_path(session_id: str) -> str:
     """Get the path to the session file."""
     return os.path.join(CHAT_SESSIONS_DIR, f"{session_id}.json")
 
-def load_session(session_id: str) -> Optional[ChatSession]:
+def get_session_log_path(session_id: str) -> str:
+    """Get the path to the session's message journal."""
+    return os.path.join(CHAT_SESSIONS_DIR, f"{session_id}.log")
+
+# A session is stored as a JSON snapshot plus a journal of the messages added since,
+# one JSON object per line, so each chat turn only appends its new messages. Once the
+# journal grows past this size the next save writes a fresh snapshot instead.
+SESSION_LOG_COMPACT_BYTES = 1 << 20
+
+# What is on disk for each session this process has loaded or written: the number
+# of messages, the other session fields and the journal size
+PERSISTED_SESSIONS: Dict[str, Tuple[int, Dict[str, Any], int]] = {}
+
+def append_to_file(path: str, data: bytes):
+    """Append data to a file with a single write call."""
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+def replay_session_log(session: ChatSession, data: bytes):
+    """Apply the journaled messages to a session loaded from its snapshot."""
+    for line in data.splitlines():
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # A line torn by an interrupted write
+            continue
+        # Messages already in the snapshot are skipped, so replaying is idempotent
+        if record.get("index") == len(session.messages):
+            session.messages.append(ChatMessage.model_validate(record))
+
+async def write_session(session: ChatSession):
+    """Write a session's new messages to its journal, or a full snapshot when needed.
+
+    The session may be the live object that chat turns keep appending to, so what
+    gets written and recorded is taken before any await.
+    """
+    count = len(session.messages)
+    fields = session.model_dump(exclude={"messages"})
+    persisted = PERSISTED_SESSIONS.get(session.id)
+    if persisted is not None:
+        message_count, persisted_fields, log_size = persisted
+        if (
+            persisted_fields == fields
+            and message_count <= count
+            and log_size < SESSION_LOG_COMPACT_BYTES
+        ):
+            data = b"".join(
+                orjson.dumps({"index": index, **message.model_dump()}) + b"\n"
+                for index, message in enumerate(session.messages[message_count:count], start=message_count)
+            )
+            if data:
+                await asyncio.to_thread(append_to_file, get_session_log_path(session.id), data)
+            PERSISTED_SESSIONS[session.id] = (count, fields, log_size + len(data))
+            return
+    
+    # New session, changed title or a long journal: write a snapshot and start a new journal
+    snapshot = session.model_copy(deep=True)
+    session_path = get_session_path(session.id)
+    await write_json_model(session_path + ".tmp", snapshot)
+    os.replace(session_path + ".tmp", session_path)
+    log_path = get_session_log_path(session.id)
+    if os.path.exists(log_path):
+        os.remove(log_path)
+    PERSISTED_SESSIONS[session.id] = (count, fields, 0)
+
+def remove_session_files(session_id: str):
+    """Remove a session's snapshot and journal from disk."""
+    for path in (get_session_path(session_id), get_session_log_path(session_id)):
+        if os.path.exists(path):
+            os.remove(path)
+    PERSISTED_SESSIONS.pop(session_id, None)
+
+# Sessions saved but not yet written to disk, by id. Repeated saves of a session
+# before the writer gets to it are coalesced into a single file write.
+PENDING_SESSION_SAVES: Dict[str, ChatSession] = {}
+SESSION_WRITE_QUEUE: asyncio.Queue = asyncio.Queue()
+
+# Futures resolved once a pending session has been written, by id. save_session
+# waits on them, so a chat turn is on disk before its response is returned and the
+# next turn sees it even if another worker serves it.
+SESSION_SAVE_FLUSHES: Dict[str, asyncio.Future] = {}
+
+# Ids of deleted sessions, so a write in flight when the session was deleted, or
+# a save from a chat turn that was still running, doesn't bring it back
+DELETED_SESSIONS: set = set()
+
+def session_is_persisted(session: ChatSession) -> bool:
+    """Check whether everything in a session has been written to disk."""
+    persisted = PERSISTED_SESSIONS.get(session.id)
+    return (
+        persisted is not None
+        and persisted[0] == len(session.messages)
+        and persisted[1] == session.model_dump(exclude={"messages"})
+    )
+
+async def session_writer():
+    """Write queued session saves to disk in the background."""
+    while True:
+        session_id = await SESSION_WRITE_QUEUE.get()
+        # The session stays pending while it is written, so load_session keeps
+        # returning it until it is on disk
+        session = PENDING_SESSION_SAVES.get(session_id)
+        error = None
+        try:
+            if session is not None:
+                await write_session(session)
+        except Exception as e:
+            error = e
+            print(f"Error saving session {session_id}: {e}")
+        finally:
+            if session_id in DELETED_SESSIONS:
+                # Deleted while it was being written
+                remove_session_files(session_id)
+            pending = PENDING_SESSION_SAVES.get(session_id)
+            if pending is None or (pending is session and (error or session_is_persisted(session))):
+                PENDING_SESSION_SAVES.pop(session_id, None)
+                flush = SESSION_SAVE_FLUSHES.pop(session_id, None)
+                if flush is not None and not flush.done():
+                    if error is not None:
+                        flush.set_exception(error)
+                    else:
+                        flush.set_result(None)
+            else:
+                # Saved again while it was being written; save_session did not
+                # queue it because it was still pending
+                SESSION_WRITE_QUEUE.put_nowait(session_id)
+            SESSION_WRITE_QUEUE.task_done()
+
+async def load_session(session_id: str) -> Optional[ChatSession]:
     """Load a chat session from disk."""
+    pending = PENDING_SESSION_SAVES.get(session_id)
+    if pending is not None:
+        return pending
+    
     session_path = get_session_path(session_id)
     
     if not os.path.exists(session_path):
         return None
         
     try:
-        with open(session_path, "r") as f:
-            data = json.load(f)
-            return ChatSession(**data)
+        session = await read_json_model(session_path, ChatSession)
+        log_size = 0
+        log_path = get_session_log_path(session_id)
+        if os.path.exists(log_path):
+            async with aiofiles.open(log_path, "rb") as f:
+                data = await f.read()
+            replay_session_log(session, data)
+            # After a torn write, compact on the next save rather than append to the broken line
+            log_size = len(data) if data.endswith(b"\n") else SESSION_LOG_COMPACT_BYTES
+        PERSISTED_SESSIONS[session_id] = (
+            len(session.messages), session.model_dump(exclude={"messages"}), log_size
+        )
+        return session
     except:
         return None
 
-def save_session(session: ChatSession):
-    """Save a chat session to disk."""
-    session_path = get_session_path(session.id)
-    
-    with open(session_path, "w") as f:
-        f.write(json.dumps(session.dict(), indent=2))
-
-def get_all_sessions() -> List[ChatSession]:
-    """Get all chat sessions."""
-    sessions = []
-    
-    if not os.path.exists(CHAT_SESSIONS_DIR):
-        return sessions
-        
-    for filename in os.listdir(CHAT_SESSIONS_DIR):
-        if filename.endswith(".json"):
-            session_id = filename.split(".")[0]
-            session = load_session(session_id)
-            if session:
-                sessions.append(session)
-                
-    return sessions
-
-def create_session(first_message: str = None) -> ChatSession:
+async def save_session(session: ChatSession):
+    """Save a chat session to disk through the session writer and update its index entry."""
+    # Apply a generated title that arrived while this copy of the session was in use
+    title_update = SESSION_TITLE_UPDATES.get(session.id)
+    if title_update is not None and session.title == title_update[0]:
+        session.title = title_update[1]
+    if session.id in DELETED_SESSIONS:
+        return
+    if session.id not in PENDING_SESSION_SAVES:
+        SESSION_WRITE_QUEUE.put_nowait(session.id)
+        SESSION_SAVE_FLUSHES[session.id] = asyncio.get_running_loop().create_future()
+    PENDING_SESSION_SAVES[session.id] = session
+    METADATA_INDEX.upsert("sessions", index_row("sessions", session))
+    # Shielded so a cancelled request doesn't cancel the flush other saves wait on
+    await asyncio.shield(SESSION_SAVE_FLUSHES[session.id])
+
+def get_session_summaries() -> List[Dict[str, Any]]:
+    """Get the id, title, creation time and message count of all chat sessions."""
+    return [
+        dict(row)
+        for row in METADATA_INDEX.rows("sessions", "id, title, created_at, message_count")
+    ]
+
+async def create_session(first_message: str = None) -> ChatSession:
     """Create a new chat session."""
     session = ChatSession()
     
     if first_message:
         session.messages.append(ChatMessage(role="user", content=first_message))
         
-    save_session(session)
+    await save_session(session)
     return session
 
-def update_session_title(session: ChatSession) -> str:
-    """Generate or update the session title based on the first message."""
-    if len(session.messages) < 2 or session.title != "New Chat":
-        return session.title
-        
-    first_message = next((msg.content for msg in session.messages if msg.role == "user"), "New Chat")
-    
-    # Generate a title using the LLM
-    llm = get_llm()
-    title_prompt = ChatPromptTemplate.from_messages([
-        ("system", "Generate a short, concise title (maximum 6 words) for a conversation that starts with this message. Return ONLY the title with no additional text, quotes, or punctuation."),
-        ("user", first_message[:100] + ("..." if len(first_message) > 100 else ""))
-    ])
-    
-    title_chain = title_prompt | llm | StrOutputParser()
-    title = title_chain.invoke({})
+def provisional_session_title(first_message: str) -> str:
+    """Title a session from the first words of its first message, without an LLM call."""
+    words = first_message.split()
+    title = " ".join(words[:8]) + ("..." if len(words) > 8 else "")
+    if len(title) > 50:
+        title = title[:47] + "..."
+    return title or "New Chat"
+
+# Generated titles by session id, as (provisional title, generated title), so a save
+# of a copy of the session loaded before the title arrived doesn't revert it
+SESSION_TITLE_UPDATES = LRUCache(maxsize=1024, ttl=600)
+
+# Running title generation tasks, referenced so they aren't garbage collected
+SESSION_TITLE_TASKS: set = set()
+
+async def refine_session_title(session_id: str, first_message: str, provisional_title: str):
+    """Replace a session's provisional title with one generated by the LLM."""
+    try:
+        title = await generate_session_title(first_message)
+        SESSION_TITLE_UPDATES.set(session_id, (provisional_title, title))
+        session = await load_session(session_id)
+        # A chat turn may have saved a newer copy while the session was loading
+        session = PENDING_SESSION_SAVES.get(session_id, session)
+        # Leave sessions that were deleted or renamed meanwhile alone
+        if session is not None and session.title == provisional_title:
+            await save_session(session)
+    except Exception as e:
+        print(f"Error generating title for session {session_id}: {e}")
+
+def schedule_title_refinement(session_id: str, first_message: str, provisional_title: str):
+    """Generate a session's title in the background."""
+    task = asyncio.create_task(refine_session_title(session_id, first_message, provisional_title))
+    SESSION_TITLE_TASKS.add(task)
+    task.add_done_callback(SESSION_TITLE_TASKS.discard)
+
+async def generate_session_title(first_message: str) -> str:
+    """Generate a short title for a conversation from its first message."""
+    # Generate a title using the LLM; the message is passed as a variable, not parsed as a template
+    message = first_message[:100] + ("..." if len(first_message) > 100 else "")
+    async with LLM_SEM:
+        title = await get_title_chain().ainvoke({"message": message})
     
     # Clean up the title
     title = title.strip().strip('"').strip("'")
     if len(title) > 50:
         title = title[:47] + "..."
         
-    session.title = title
     return title
 
-def select_relevant_context(query: str, use_context: bool = True, context_docs: List[str] = None) -> str:
+async def select_relevant_context(query: str, use_context: bool = True, context_docs: List[str] = None) -> str:
     """Select relevant context from the vector store or provided context."""
     if not use_context:
         return ""
@@ -399,17 +1629,18 @@ def select_relevant_context(query: str, use_context: bool = True, context_docs:
         return "\n\n".join(context_docs)
         
     # Search for relevant context in the vector store
-    relevant_docs = search_vectorstore(query, k=3)
+    relevant_docs = await asyncio.to_thread(search_vectorstore, query, 3)
     
     if not relevant_docs:
         return ""
         
-    return "\n\n".join([doc.page_content for doc in relevant_docs])
+    context, _ = build_context(relevant_docs)
+    return context
 
 def format_messages_for_prompt(messages: List[ChatMessage]) -> List[Dict[str, str]]:
     """Format messages for the prompt."""
     # Start with the system prompt
-    formatted_messages = [SystemMessage(content=CHAT_SYSTEM_PROMPT)]
+    formatted_messages = [CHAT_SYSTEM_MESSAGE]
     
     # Add user and assistant messages
     for msg in messages:
@@ -420,10 +1651,10 @@ def format_messages_for_prompt(messages: List[ChatMessage]) -> List[Dict[str, st
     
     return formatted_messages
 
-def generate_chat_response(session: ChatSession, query: str, use_context: bool = True, context_docs: List[str] = None) -> str:
-    """Generate a response for the chat."""
+async def build_chat_messages(session: ChatSession, query: str, use_context: bool = True, context_docs: List[str] = None) -> List[Any]:
+    """Build the prompt messages for the next chat response."""
     # Get relevant context
-    context = select_relevant_context(query, use_context, context_docs)
+    context = await select_relevant_context(query, use_context, context_docs)
     
     # Create the messages for the prompt
     messages = format_messages_for_prompt(session.messages)
@@ -435,73 +1666,87 @@ def generate_chat_response(session: ChatSession, query: str, use_context: bool =
     
     # Add the current query
     messages.append(HumanMessage(content=query_with_context))
+    return messages
+
+async def generate_chat_response(session: ChatSession, query: str, use_context: bool = True, context_docs: List[str] = None) -> str:
+    """Generate a response for the chat."""
+    messages = await build_chat_messages(session, query, use_context, context_docs)
     
     # Generate the response
     llm = get_llm()
-    response = llm.invoke(messages)
+    async with LLM_SEM:
+        response = await llm.ainvoke(messages)
     
     return response.content
 
+async def stream_chat_response(session: ChatSession, query: str, use_context: bool = True, context_docs: List[str] = None) -> AsyncIterator[str]:
+    """Generate a response for the chat, yielding the text as it is produced."""
+    messages = await build_chat_messages(session, query, use_context, context_docs)
+    
+    llm = get_llm()
+    async with LLM_SEM:
+        async for chunk in llm.astream(messages):
+            if chunk.content:
+                yield chunk.content
+
 # New functions for exam papers processing
-def save_exam_paper(paper: ExamPaper):
+async def save_exam_paper(paper: ExamPaper):
     """Save exam paper metadata to JSON file."""
     file_path = os.path.join(EXAM_PAPERS_DIR, f"{paper.id}.json")
-    with open(file_path, "w") as f:
-        f.write(json.dumps(paper.dict(), indent=2))
+    await write_json_model(file_path, paper)
+    METADATA_INDEX.upsert("exam_papers", index_row("exam_papers", paper))
         
-def load_exam_paper(paper_id: str) -> Optional[ExamPaper]:
+async def load_exam_paper(paper_id: str) -> Optional[ExamPaper]:
     """Load exam paper metadata from JSON file."""
     file_path = os.path.join(EXAM_PAPERS_DIR, f"{paper_id}.json")
     if not os.path.exists(file_path):
         return None
         
-    with open(file_path, "r") as f:
-        return ExamPaper(**json.loads(f.read()))
-        
-def get_all_exam_papers() -> List[ExamPaper]:
-    """Get all exam papers metadata."""
-    papers = []
-    for filename in os.listdir(EXAM_PAPERS_DIR):
-        if filename.endswith(".json"):
-            paper_id = filename.replace(".json", "")
-            paper = load_exam_paper(paper_id)
-            if paper:
-                papers.append(paper)
-    return papers
-
-def process_exam_paper(file_path: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
-    """Process an exam paper PDF and extract metadata and content."""
+    return await read_json_model(file_path, ExamPaper)
+
+# Only the start of an exam paper is sent to the LLM for analysis
+EXAM_ANALYSIS_MAX_CHARS = 10000
+
+async def process_exam_paper(
+    file_path: str,
+    metadata: Dict[str, Any],
+    preloaded_docs: Optional[Tuple[List[Document], List[Document]]] = None,
+) -> Dict[str, Any]:
+    """Process an exam paper PDF and extract metadata and content.
+
+    preloaded_docs is the (pages, chunks) result of load_and_split_pdf, when the
+    caller has already parsed the file.
+    """
     # Load PDF
     try:
-        loader = PyPDFLoader(file_path)
-        pages = loader.load()
+        if preloaded_docs is not None:
+            pages, chunks = preloaded_docs
+        else:
+            # Parsing and splitting are CPU-bound, so both run in the PDF process pool
+            pages, chunks = await asyncio.get_running_loop().run_in_executor(
+                get_pdf_pool(), load_and_split_pdf, file_path
+            )
         
-        # Extract text
-        full_text = "\n\n".join([page.page_content for page in pages])
+        # Extract the text for analysis page by page, stopping once the limit is reached
+        buf = io.StringIO()
+        for n, page in enumerate(pages):
+            if n:
+                buf.write("\n\n")
+            buf.write(page.page_content)
+            if buf.tell() >= EXAM_ANALYSIS_MAX_CHARS:
+                break
+        analysis_text = buf.getvalue()[:EXAM_ANALYSIS_MAX_CHARS]
         
         # Use LLM to analyze the exam paper
-        llm = get_llm()
-        prompt = ChatPromptTemplate.from_template(EXAM_PAPER_PROCESSING_PROMPT)
-        chain = prompt | llm | StrOutputParser()
+        chain = get_exam_analysis_chain()
         
-        analysis = chain.invoke({"text": full_text[:10000]})  # Limit text size for analysis
+        async with LLM_SEM:
+            analysis = await chain.ainvoke({"text": analysis_text})
         
         # Add metadata
         metadata["analysis"] = analysis
         metadata["page_count"] = len(pages)
         
-        # Split text and add to vector store
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100,
-            length_function=len,
-        )
-        
-        chunks = text_splitter.split_documents(pages)
-        
-        # Add document to vector store
-        vectorstore = get_or_create_vectorstore()
-        
         # Create a unique document ID
         doc_id = str(uuid.uuid4())
         
@@ -517,8 +1762,8 @@ def process_exam_paper(file_path: str, metadata: Dict[str, Any]) -> Dict[str, An
             }
             chunk.metadata.update(chunk_metadata)
         
-        if vectorstore:
-            vectorstore.add_documents(chunks)
+        # Add document to vector store
+        queue_vector_documents(chunks)
         
         metadata["document_id"] = doc_id
         return metadata
@@ -526,172 +1771,72 @@ def process_exam_paper(file_path: str, metadata: Dict[str, Any]) -> Dict[str, An
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
 
-def save_mindmap(mindmap: MindMap):
+async def save_mindmap(mindmap: MindMap):
     """Save mindmap to JSON file."""
     file_path = os.path.join(MINDMAPS_DIR, f"{mindmap.id}.json")
-    with open(file_path, "w") as f:
-        f.write(json.dumps(mindmap.dict(), indent=2))
+    await write_json_model(file_path, mindmap)
+    METADATA_INDEX.upsert("mindmaps", index_row("mindmaps", mindmap))
         
-def load_mindmap(mindmap_id: str) -> Optional[MindMap]:
+async def load_mindmap(mindmap_id: str) -> Optional[MindMap]:
     """Load mindmap from JSON file."""
     file_path = os.path.join(MINDMAPS_DIR, f"{mindmap_id}.json")
     if not os.path.exists(file_path):
         return None
         
-    with open(file_path, "r") as f:
-        return MindMap(**json.loads(f.read()))
-        
-def get_all_mindmaps() -> List[MindMap]:
-    """Get all mindmaps."""
-    mindmaps = []
-    for filename in os.listdir(MINDMAPS_DIR):
-        if filename.endswith(".json"):
-            mindmap_id = filename.replace(".json", "")
-            mindmap = load_mindmap(mindmap_id)
-            if mindmap:
-                mindmaps.append(mindmap)
-    return mindmaps
-
-def generate_mindmap(subject: str, topic: Optional[str] = None) -> MindMap:
+    return await read_json_model(file_path, MindMap)
+
+async def generate_mindmap(subject: str, topic: Optional[str] = None) -> MindMap:
     """Generate a mindmap for a subject and optional topic."""
     try:
         # Get relevant context from vector store
         search_query = f"{subject} {topic if topic else ''}"
-        context_docs = search_vectorstore(search_query, k=5)
-        context = "\n\n".join([doc.page_content for doc in context_docs])
-        
-        # Generate mindmap using LLM
-        llm = get_llm()
+        cached = await lookup_cached_artifact("mindmap", subject, topic, load_mindmap)
+        if cached is not None:
+            return cached
+        context_docs = await asyncio.to_thread(search_vectorstore, search_query, 5)
+        context, _ = build_context(context_docs)
+        
+        # Generate mindmap using LLM, constrained to the mindmap JSON schema
+        llm = get_mindmap_llm()
         topic_clause = f" focusing on {topic}" if topic else ""
         
         try:
-            # Build the prompt directly without using templates
-            prompt_content = f"""
-You are an expert educational content designer specializing in creating structured mind maps.
-Your task is to generate a comprehensive mind map structure for the subject '{subject}'{topic_clause}.
-
-The mind map should:
-1. Have a clear hierarchical structure
-2. Cover the key concepts and their relationships
-3. Be educational and follow a logical learning progression
-4. Include important subtopics, formulas, and principles
+            messages = [
+                MINDMAP_SYSTEM_MESSAGE,
+                HumanMessage(content=f"""Create a mind map for the subject '{subject}'{topic_clause}.
 
 If provided, use this additional context information to enhance the mind map:
-{context}
-
-Return the mind map as a nested JSON object with the following structure:
-{{
-  "root_node": {{
-    "id": "unique_id_string",
-    "label": "Main Topic",
-    "description": "Brief description of the topic"
-  }},
-  "nodes": {{
-    "unique_id_string": {{
-      "id": "unique_id_string",
-      "label": "Node Label",
-      "description": "Node description",
-      "children": ["child_id_1", "child_id_2"]
-    }},
-    "child_id_1": {{
-      "id": "child_id_1",
-      "label": "Child Node 1",
-      "description": "Description",
-      "children": []
-    }}
-  }}
-}}
-
-Make sure each node has a unique ID and that parent-child relationships are properly defined.
-Take into account that this will be used by students preparing for exams, so it should be comprehensive but focused on exam-relevant material.
-"""
-            
-            # Use a direct approach with HumanMessage
-            messages = [HumanMessage(content=prompt_content)]
-            
-            # Create parser to handle the JSON output
-            class MindMapOutputParser(JsonOutputParser):
-                def parse(self, text):
-                    # Extract json part and handle all types of code blocks
-                    try:
-                        print("Parsing response from LLM...")
-                        # Basic JSON extraction using string manipulation
-                        if "```json" in text:
-                            text = text.split("```json")[1].split("```")[0].strip()
-                        elif "```" in text:
-                            text = text.split("```")[1].split("```")[0].strip()
-                        elif "{" in text and "}" in text:
-                            # Extract just the JSON object if it's embedded in other text
-                            start_index = text.find("{")
-                            end_index = text.rfind("}") + 1
-                            if start_index >= 0 and end_index > start_index:
-                                text = text[start_index:end_index]
-                        
-                        try:
-                            print("Attempting to parse JSON...")
-                            parsed_data = json.loads(text)
-                            # Validate required fields are present
-                            if "root_node" not in parsed_data:
-                                print(f"Missing 'root_node' in response. Response keys: {list(parsed_data.keys())}")
-                                raise ValueError("Missing 'root_node' in response")
-                            if "nodes" not in parsed_data:
-                                print(f"Missing 'nodes' in response. Response keys: {list(parsed_data.keys())}")
-                                raise ValueError("Missing 'nodes' in response")
-                            return parsed_data
-                        except json.JSONDecodeError as json_err:
-                            print(f"JSON parsing error: {str(json_err)}\nText: {text[:500]}...")
-                            raise ValueError(f"Invalid JSON format: {str(json_err)}")
-                    except Exception as e:
-                        # More robust error handling with detailed logging
-                        print(f"Error parsing mindmap output: {str(e)}")
-                        print(f"Raw text received (first 1000 chars): {text[:1000]}")
-                        # Try one more direct parsing approach as last resort
-                        try:
-                            # Try to find and extract just the JSON part more aggressively
-                            import re
-                            json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-                            matches = re.findall(json_pattern, text)
-                            if matches:
-                                for potential_json in matches:
-                                    try:
-                                        result = json.loads(potential_json)
-                                        if "root_node" in result and "nodes" in result:
-                                            return result
-                                    except:
-                                        continue
-                            # If all else fails, try direct parsing
-                            return json.loads(text)
-                        except Exception as direct_error:
-                            error_msg = f"Failed to parse mindmap output: {str(direct_error)}"
-                            print(error_msg)
-                            print(f"Text received: {text[:500]}...")
-                            raise ValueError(error_msg)
+{context}"""),
+            ]
             
             # Directly invoke the LLM with the messages
             print(f"Sending request to LLM for subject: {subject}, topic: {topic if topic else 'None'}")
-            result = llm.invoke(messages)
-            parser = MindMapOutputParser()
-            mind_map_data = parser.parse(result.content)
+            async with LLM_SEM:
+                result = await llm.ainvoke(messages)
+            mind_map_data = result["parsed"]
+            if mind_map_data is None:
+                # Only reached if the reply did not validate against the schema
+                print(f"Structured mindmap output failed: {result['parsing_error']}")
+                mind_map_data = MindMapSchema.model_validate(json.loads(result["raw"].content))
             
-            # Extract root node and nodes
-            root_node = mind_map_data.get("root_node", {})
-            if not root_node:
-                raise ValueError("Root node is empty in the generated mind map")
-                
-            nodes = mind_map_data.get("nodes", {})
-            if not nodes:
+            root_node = mind_map_data.root_node
+            if not mind_map_data.nodes:
                 raise ValueError("No nodes found in the generated mind map")
             
             # Create MindMap object
             mindmap = MindMap(
                 title=f"{subject}{' - ' + topic if topic else ''} Mind Map",
-                root_node_id=root_node.get("id", ""),
-                nodes={**{root_node.get("id", ""): MindMapNode(**root_node)}, **{k: MindMapNode(**v) for k, v in nodes.items()}},
+                root_node_id=root_node.id,
+                nodes={
+                    node.id: MindMapNode(**node.model_dump())
+                    for node in [root_node, *mind_map_data.nodes]
+                },
                 subject=subject
             )
             
             # Save mindmap
-            save_mindmap(mindmap)
+            await save_mindmap(mindmap)
+            await cache_artifact("mindmap", subject, topic, mindmap.id)
             return mindmap
             
         except Exception as e:
@@ -707,80 +1852,47 @@ Take into account that this will be used by students preparing for exams, so it
         print(error_details)
         raise HTTPException(status_code=500, detail=error_details)
 
-def save_learning_module(module: LearningModule):
+async def save_learning_module(module: LearningModule):
     """Save learning module to JSON file."""
     file_path = os.path.join(LEARNING_MODULES_DIR, f"{module.id}.json")
-    with open(file_path, "w") as f:
-        f.write(json.dumps(module.dict(), indent=2))
+    await write_json_model(file_path, module)
+    METADATA_INDEX.upsert("learning_modules", index_row("learning_modules", module))
         
-def load_learning_module(module_id: str) -> Optional[LearningModule]:
+async def load_learning_module(module_id: str) -> Optional[LearningModule]:
     """Load learning module from JSON file."""
     file_path = os.path.join(LEARNING_MODULES_DIR, f"{module_id}.json")
     if not os.path.exists(file_path):
         return None
         
-    with open(file_path, "r") as f:
-        return LearningModule(**json.loads(f.read()))
-        
-def get_all_learning_modules() -> List[LearningModule]:
-    """Get all learning modules."""
-    modules = []
-    for filename in os.listdir(LEARNING_MODULES_DIR):
-        if filename.endswith(".json"):
-            module_id = filename.replace(".json", "")
-            module = load_learning_module(module_id)
-            if module:
-                modules.append(module)
-    return modules
-
-def generate_learning_module(subject: str, topic: Optional[str] = None) -> LearningModule:
+    return await read_json_model(file_path, LearningModule)
+
+async def generate_learning_module(subject: str, topic: Optional[str] = None) -> LearningModule:
     """Generate a learning module for a subject and optional topic."""
     try:
         # Get relevant context from vector store
         search_query = f"{subject} {topic if topic else ''}"
-        context_docs = search_vectorstore(search_query, k=8)
-        context = "\n\n".join([doc.page_content for doc in context_docs])
+        cached = await lookup_cached_artifact("module", subject, topic, load_learning_module)
+        if cached is not None:
+            return cached
+        context_docs = await asyncio.to_thread(search_vectorstore, search_query, 8)
         
-        # Identify related questions
-        related_questions = []
-        for doc in context_docs:
-            if "source" in doc.metadata and doc.metadata["source"] == "exam_paper":
-                related_questions.append(doc.page_content)
+        # Build the context and identify related questions
+        context, related_questions = build_context(context_docs)
         
         # Generate learning module using LLM
-        llm = get_llm()
+        llm = get_llm("module")
         topic_clause = f" focusing on {topic}" if topic else ""
         
-        # Use direct prompt formatting instead of ChatPromptTemplate
-        prompt_content = f"""
-You are an expert in educational content development. Create a comprehensive learning module for students studying {subject}{topic_clause}.
-
-Your learning module should include:
-1. An introduction to the topic
-2. Key concepts clearly explained
-3. Theoretical foundation with proper mathematical notation
-4. Practical examples and applications
-5. Common exam questions and how to approach them
-6. Tips for exam preparation
-
-IMPORTANT FORMATTING INSTRUCTIONS:
-1. Format ALL mathematical expressions using Markdown-compatible LaTeX syntax:
-   - For inline formulas, use single dollar signs: $E=mc^2$
-   - For display/block formulas, use double dollar signs: $$\\sum_{{i=1}}^{{n}} i = \\frac{{n(n+1)}}{{2}}$$
-2. Ensure all special LaTeX characters are properly escaped with double backslashes
-3. Always use double braces for LaTeX subscripts and superscripts: $x_{{i}}$ not $x_i$
-4. Use markdown headings (##, ###) to organize the content into clear sections
+        messages = [
+            LEARNING_MODULE_SYSTEM_MESSAGE,
+            HumanMessage(content=f"""Create a comprehensive learning module for students studying {subject}{topic_clause}.
 
 Based on the examination context and the following relevant information:
 
-{context}
-
-Create a comprehensive learning module:
-"""
-        
-        # Use direct approach with HumanMessage
-        messages = [HumanMessage(content=prompt_content)]
-        result = llm.invoke(messages)
+{context}"""),
+        ]
+        async with LLM_SEM:
+            result = await llm.ainvoke(messages)
         content = result.content
         
         # Create LearningModule object
@@ -792,7 +1904,8 @@ Create a comprehensive learning module:
         )
         
         # Save module
-        save_learning_module(module)
+        await save_learning_module(module)
+        await cache_artifact("module", subject, topic, module.id)
         return module
         
     except Exception as e:
@@ -801,75 +1914,257 @@ Create a comprehensive learning module:
         print(error_details)
         raise HTTPException(status_code=500, detail=error_details)
 
-def save_podcast(podcast: Podcast):
+async def save_podcast(podcast: Podcast):
     """Save podcast to JSON file."""
     file_path = os.path.join(PODCASTS_DIR, f"{podcast.id}.json")
-    with open(file_path, "w") as f:
-        f.write(json.dumps(podcast.dict(), indent=2))
+    await write_json_model(file_path, podcast)
+    METADATA_INDEX.upsert("podcasts", index_row("podcasts", podcast))
         
-def load_podcast(podcast_id: str) -> Optional[Podcast]:
+async def load_podcast(podcast_id: str) -> Optional[Podcast]:
     """Load podcast from JSON file."""
     file_path = os.path.join(PODCASTS_DIR, f"{podcast_id}.json")
     if not os.path.exists(file_path):
         return None
         
-    with open(file_path, "r") as f:
-        return Podcast(**json.loads(f.read()))
-        
-def get_all_podcasts() -> List[Podcast]:
-    """Get all podcasts."""
-    podcasts = []
-    for filename in os.listdir(PODCASTS_DIR):
-        if filename.endswith(".json"):
-            podcast_id = filename.replace(".json", "")
-            podcast = load_podcast(podcast_id)
-            if podcast:
-                podcasts.append(podcast)
-    return podcasts
-
-def generate_podcast_script(subject: str, topic: Optional[str] = None, duration_minutes: int = 10) -> Podcast:
+    return await read_json_model(file_path, Podcast)
+
+# ElevenLabs text-to-speech settings
+ELEVENLABS_VOICE_ID = "FGY2WhTYpPnrIDTdsKH5"  # Default voice ID
+ELEVENLABS_MODEL_ID = "eleven_multilingual_v2"
+ELEVENLABS_TTS_URL = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+
+# Speech synthesis of a long script can take minutes; only connecting should fail fast
+TTS_TIMEOUT = httpx.Timeout(300.0, connect=10.0)
+TTS_STREAM_CHUNK_SIZE = 65536
+# Audio is written to disk in blocks of this size rather than once per streamed chunk
+AUDIO_WRITE_BUFFER_SIZE = 256 * 1024
+
+@functools.lru_cache(maxsize=4)
+def get_elevenlabs_client(api_key: str) -> ElevenLabs:
+    """Return a shared ElevenLabs client, so its connection pool is reused across calls."""
+    return ElevenLabs(api_key=api_key)
+
+def synthesize_with_sdk(api_key: str, text: str, audio_path: str):
+    """Convert text to speech with the ElevenLabs SDK and write the MP3 to audio_path."""
+    client = get_elevenlabs_client(api_key)
+    audio = client.text_to_speech.convert(
+        voice_id=ELEVENLABS_VOICE_ID,
+        output_format="mp3_44100_128",
+        text=text,
+        model_id=ELEVENLABS_MODEL_ID,
+    )
+    
+    # Handle the response whether it's a generator (stream) or bytes
+    with open(audio_path, "wb", buffering=AUDIO_WRITE_BUFFER_SIZE) as f:
+        if hasattr(audio, '__iter__') and not isinstance(audio, bytes):
+            total_bytes = 0
+            for chunk in audio:
+                total_bytes += len(chunk)
+                f.write(chunk)
+            print(f"Wrote {total_bytes} bytes")
+        else:
+            f.write(audio)
+            print(f"Wrote {len(audio)} bytes directly")
+
+async def synthesize_with_http(api_key: str, text: str, audio_path: str):
+    """Convert text to speech with a direct API request, streaming the MP3 to audio_path."""
+    headers = {
+        "Accept": "audio/mpeg",
+        "Content-Type": "application/json",
+        "xi-api-key": api_key
+    }
+    data = {
+        "text": text,
+        "model_id": ELEVENLABS_MODEL_ID,
+        "voice_settings": {
+            "stability": 0.5,
+            "similarity_boost": 0.5
+        }
+    }
+    
+    async with HTTP_CLIENT.stream(
+        "POST", ELEVENLABS_TTS_URL, json=data, headers=headers, timeout=TTS_TIMEOUT
+    ) as response:
+        if response.status_code != 200:
+            body = await response.aread()
+            raise Exception(f"Direct API request failed: {response.status_code} - {body[:500]!r}")
+        # Collect the streamed chunks and write them AUDIO_WRITE_BUFFER_SIZE at a time
+        buffer = bytearray()
+        async with aiofiles.open(audio_path, "wb") as f:
+            async for chunk in response.aiter_bytes(TTS_STREAM_CHUNK_SIZE):
+                buffer += chunk
+                if len(buffer) >= AUDIO_WRITE_BUFFER_SIZE:
+                    await f.write(buffer)
+                    buffer.clear()
+            if buffer:
+                await f.write(buffer)
+
+async def synthesize_speech(api_key: str, text: str, audio_path: str):
+    """Convert text to speech, falling back to a direct API request if the SDK fails."""
+    try:
+        # The SDK is synchronous, so run it off the event loop
+        await asyncio.to_thread(synthesize_with_sdk, api_key, text, audio_path)
+    except Exception as sdk_error:
+        print(f"ElevenLabs SDK failed: {str(sdk_error)}")
+        print("Trying alternative approach...")
+        try:
+            await synthesize_with_http(api_key, text, audio_path)
+        except Exception as direct_error:
+            raise Exception(f"Failed to generate audio: {str(sdk_error)} AND {str(direct_error)}")
+
+# The transcript is synthesized as paragraph-aligned chunks of about this many
+# characters, up to TTS_MAX_CONCURRENCY at a time, and the MP3 parts concatenated
+TTS_CHUNK_CHARS = 2500
+TTS_MAX_CONCURRENCY = 4
+
+def concatenate_files(part_paths: List[str], output_path: str):
+    """Append the part files to output_path in order. MP3 streams can be joined byte for byte."""
+    with open(output_path, "wb") as output:
+        for part_path in part_paths:
+            with open(part_path, "rb") as part:
+                shutil.copyfileobj(part, output, AUDIO_WRITE_BUFFER_SIZE)
+
+def fsync_file(path: str):
+    """Flush a finished file to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class StreamingPodcastSynthesizer:
+    """Synthesizes a podcast transcript while it is still being generated.
+
+    Text is fed in as it streams from the LLM and grouped into paragraph-aligned
+    chunks of at most max_chars (a longer paragraph becomes a chunk of its own).
+    Each chunk is sent to TTS as soon as it is complete, so speech synthesis
+    overlaps with the rest of the script being written. Part files are written to
+    PODCAST_PARTS_DIR and only the finished audio is moved to audio_path.
+    """
+
+    def __init__(self, api_key: str, audio_path: str, max_chars: int = TTS_CHUNK_CHARS):
+        self.api_key = api_key
+        self.audio_path = audio_path
+        self.max_chars = max_chars
+        self._joined_path = os.path.join(PODCAST_PARTS_DIR, os.path.basename(audio_path))
+        self._base_path, self._extension = os.path.splitext(self._joined_path)
+        self._semaphore = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
+        self._pending = ""  # Text after the last paragraph break
+        self._paragraphs: List[str] = []  # Complete paragraphs of the next chunk
+        self._chunk_len = 0
+        self._tasks: List[asyncio.Task] = []
+        self._part_paths: List[str] = []
+
+    def feed(self, text: str):
+        """Add streamed text, starting synthesis of any chunk it completes."""
+        self._pending += text
+        *paragraphs, self._pending = self._pending.split("\n\n")
+        for paragraph in paragraphs:
+            self._add_paragraph(paragraph)
+
+    def _add_paragraph(self, paragraph: str):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            return
+        if self._paragraphs and self._chunk_len + 2 + len(paragraph) > self.max_chars:
+            self._start_chunk()
+        self._paragraphs.append(paragraph)
+        self._chunk_len += len(paragraph) + (2 if self._chunk_len else 0)
+
+    def _start_chunk(self):
+        text = "\n\n".join(self._paragraphs)
+        self._paragraphs, self._chunk_len = [], 0
+        part_path = f"{self._base_path}_{len(self._part_paths)}{self._extension}"
+        self._part_paths.append(part_path)
+        self._tasks.append(asyncio.create_task(self._synthesize(text, part_path)))
+
+    async def _synthesize(self, text: str, part_path: str):
+        async with self._semaphore:
+            await synthesize_speech(self.api_key, text, part_path)
+
+    async def finish(self):
+        """Synthesize the remaining text and write the joined audio to audio_path."""
+        try:
+            self._add_paragraph(self._pending)
+            self._pending = ""
+            if self._paragraphs:
+                self._start_chunk()
+            if not self._tasks:
+                raise ValueError("Transcript is empty")
+            await asyncio.gather(*self._tasks)
+            if len(self._part_paths) == 1:
+                os.replace(self._part_paths[0], self._joined_path)
+            else:
+                await asyncio.to_thread(concatenate_files, self._part_paths, self._joined_path)
+            await asyncio.to_thread(fsync_file, self._joined_path)
+            os.replace(self._joined_path, self.audio_path)
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Cancel any synthesis still running and remove the part files."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for part_path in [*self._part_paths, self._joined_path]:
+            if os.path.exists(part_path):
+                os.unlink(part_path)
+
+async def generate_podcast_script(subject: str, topic: Optional[str] = None, duration_minutes: int = 10) -> Podcast:
     """Generate a podcast script for a subject and optional topic, and convert to audio."""
     try:
         # Get relevant context from vector store
         search_query = f"{subject} {topic if topic else ''}"
-        context_docs = search_vectorstore(search_query, k=5)
-        context = "\n\n".join([doc.page_content for doc in context_docs])
+        # A cached podcast carries its audio_path, so the TTS call is skipped as well
+        cached = await lookup_cached_artifact(
+            "podcast", subject, topic, load_podcast, duration_minutes=duration_minutes
+        )
+        if cached is not None:
+            return cached
+        context_docs = await asyncio.to_thread(search_vectorstore, search_query, 5)
+        context, _ = build_context(context_docs)
         
         # Generate podcast script using LLM
         llm = get_llm()
         topic_clause = f" focusing on {topic}" if topic else ""
         
-        # Use direct prompt formatting instead of ChatPromptTemplate
-        prompt_content = f"""
-You are an educational podcast creator. Write a script for a {duration_minutes}-minute podcast episode about {subject}{topic_clause}.
-
-The podcast should:
-1. Have a clear introduction that hooks the listener
-2. Present key concepts in a logical progression
-3. Explain complex ideas in conversational, accessible language
-4. Include verbal cues for transitions between topics
-5. End with a summary and key takeaways
-
-Remember this is an audio format, so:
-- Avoid references to visual elements
-- Use verbal descriptions for equations (e.g., "the square root of x plus y" instead of "√(x+y)")
-- Use signposting and transitions to guide the listener
-- Maintain a friendly, engaging tone throughout
+        messages = [
+            PODCAST_SYSTEM_MESSAGE,
+            HumanMessage(content=f"""Write a script for a {duration_minutes}-minute podcast episode about {subject}{topic_clause}.
 
 Based on the following relevant information:
 
-{context}
-
-Create a podcast script:
-"""
-        
-        # Use direct approach with HumanMessage
-        messages = [HumanMessage(content=prompt_content)]
-        result = llm.invoke(messages)
-        transcript = result.content
+{context}"""),
+        ]
         
-        # Create Podcast object with a unique ID
+        # Create the podcast ID up front so audio can be synthesized while the script streams
         podcast_id = str(uuid.uuid4())
+        audio_filename = f"{podcast_id}.mp3"
+        
+        # Get ElevenLabs API key from environment variable
+        eleven_api_key = os.getenv("ELEVENLABS_API_KEY")
+        synthesizer = None
+        if eleven_api_key:
+            synthesizer = StreamingPodcastSynthesizer(
+                eleven_api_key, os.path.join(PODCAST_AUDIO_DIR, audio_filename)
+            )
+        else:
+            print("Warning: ELEVENLABS_API_KEY not found. Skipping audio generation.")
+        
+        transcript_parts = []
+        try:
+            async with LLM_SEM:
+                async for chunk in llm.astream(messages):
+                    transcript_parts.append(chunk.content)
+                    if synthesizer:
+                        synthesizer.feed(chunk.content)
+        except BaseException:
+            # Including cancellation, so TTS requests already started are stopped too
+            if synthesizer:
+                await synthesizer.close()
+            raise
+        transcript = "".join(transcript_parts)
+        
         podcast = Podcast(
             id=podcast_id,
             title=f"{subject}{' - ' + topic if topic else ''} Podcast",
@@ -878,110 +2173,29 @@ Create a podcast script:
             duration_seconds=duration_minutes * 60  # Estimate
         )
         
-        # Generate audio from transcript using ElevenLabs
-        try:
-            # Get ElevenLabs API key from environment variable
-            eleven_api_key = os.getenv("ELEVENLABS_API_KEY")
-            if not eleven_api_key:
-                print("Warning: ELEVENLABS_API_KEY not found. Skipping audio generation.")
-            else:
-                # Initialize ElevenLabs client
-                client = ElevenLabs(api_key=eleven_api_key)
-                
-                # Create audio file path
-                audio_filename = f"{podcast_id}.mp3"
-                audio_path = os.path.join(PODCAST_AUDIO_DIR, audio_filename)
-                
-                try:
-                    # First attempt - streaming approach
-                    print(f"Calling ElevenLabs API to generate audio for podcast: {podcast_id}")
-                    audio = client.text_to_speech.convert(
-                        voice_id="FGY2WhTYpPnrIDTdsKH5",  # Default voice ID
-                        output_format="mp3_44100_128",
-                        text=transcript,
-                        model_id="eleven_multilingual_v2",
-                        # stream=True  # Use streaming mode to handle large responses
-                    )
-                    
-                    # Debug audio response type
-                    print(f"ElevenLabs response type: {type(audio)}")
-                    print(f"Saving audio to: {audio_path}")
-                    
-                    # Handle the response whether it's a generator (stream) or bytes
-                    with open(audio_path, "wb") as f:
-                        if hasattr(audio, '__iter__') and not isinstance(audio, bytes):
-                            # If it's a generator/iterator, read chunks and write them
-                            chunk_count = 0
-                            total_bytes = 0
-                            for chunk in audio:
-                                chunk_size = len(chunk)
-                                total_bytes += chunk_size
-                                f.write(chunk)
-                                chunk_count += 1
-                            print(f"Wrote {chunk_count} chunks, total of {total_bytes} bytes")
-                        else:
-                            # If it's bytes, write directly
-                            f.write(audio)
-                            print(f"Wrote {len(audio)} bytes directly")
-                    
-                    print(f"Audio file saved successfully: {audio_filename}")
-                    
-                except Exception as streaming_error:
-                    # Fallback - direct file generation
-                    print(f"Streaming approach failed: {str(streaming_error)}")
-                    print("Trying alternative approach...")
-                    
-                    # Try a direct approach with file output
-                    try:
-                        # Different method that generates and directly saves the file
-                        
-                        # ElevenLabs API endpoint for text-to-speech
-                        url = f"https://api.elevenlabs.io/v1/text-to-speech/FGY2WhTYpPnrIDTdsKH5"
-                        
-                        headers = {
-                            "Accept": "audio/mpeg",
-                            "Content-Type": "application/json",
-                            "xi-api-key": eleven_api_key
-                        }
-                        
-                        data = {
-                            "text": transcript,
-                            "model_id": "eleven_multilingual_v2",
-                            "voice_settings": {
-                                "stability": 0.5,
-                                "similarity_boost": 0.5
-                            }
-                        }
-                        
-                        print("Making direct request to ElevenLabs API...")
-                        response = requests.post(url, json=data, headers=headers)
-                        
-                        if response.status_code == 200:
-                            # Save the audio file
-                            with open(audio_path, "wb") as f:
-                                f.write(response.content)
-                            print(f"Direct request successful. Audio saved to {audio_path}")
-                        else:
-                            print(f"Direct request failed: {response.status_code} - {response.text}")
-                            raise Exception(f"Direct API request failed: {response.status_code}")
-                    
-                    except Exception as direct_error:
-                        print(f"Both approaches failed. Error: {str(direct_error)}")
-                        raise Exception(f"Failed to generate audio: {str(streaming_error)} AND {str(direct_error)}")
+        # Wait for the remaining ElevenLabs audio
+        if synthesizer:
+            try:
+                await synthesizer.finish()
+                print(f"Audio file saved successfully: {audio_filename}")
                 
                 # Update podcast with audio path
                 podcast.audio_path = f"/podcasts/audio/{audio_filename}"
                 
-                # Get audio duration if possible
-                # This would require a library like pydub to get actual duration
-                # For now, we'll keep the estimate based on words
+                # Replace the estimate with the real duration, read from the MP3 frame headers
+                duration = await asyncio.to_thread(mp3_file_duration, synthesizer.audio_path)
+                if duration > 0:
+                    podcast.duration_seconds = round(duration)
                 
-        except Exception as audio_error:
-            print(f"Error generating audio: {str(audio_error)}")
-            # Continue without audio, just using the transcript
+            except Exception as audio_error:
+                print(f"Error generating audio: {str(audio_error)}")
+                # Continue without audio, just using the transcript
         
         # Save podcast metadata
-        save_podcast(podcast)
+        await save_podcast(podcast)
+        # Transcript-only podcasts are not cached so audio is retried next time
+        if podcast.audio_path:
+            await cache_artifact("podcast", subject, topic, podcast.id, duration_minutes=duration_minutes)
         return podcast
         
     except Exception as e:
@@ -990,11 +2204,71 @@ Create a podcast script:
         print(error_details)
         raise HTTPException(status_code=500, detail=error_details)
 
+# Size of the chunks used when copying uploaded files to disk
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+async def save_upload_to_temp(
+    file: UploadFile, suffix: str = ".pdf", directory: Optional[str] = None
+) -> Tuple[str, str]:
+    """Stream an uploaded file to a temporary file, in directory if given.
+
+    Returns the path of the temporary file and the SHA-256 hash of its content.
+    Raises a 413 error if the upload is larger than MAX_UPLOAD_BYTES.
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Uploaded file is too large")
+    
+    digest = hashlib.sha256()
+    bytes_written = 0
+    # Copy the upload in chunks with non-blocking writes, so only one chunk
+    # is held in memory at a time
+    async with aiofiles.tempfile.NamedTemporaryFile(
+        "wb", delete=False, suffix=suffix, dir=directory
+    ) as temp_file:
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                bytes_written += len(chunk)
+                if bytes_written > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail="Uploaded file is too large")
+                digest.update(chunk)
+                await temp_file.write(chunk)
+        except BaseException:
+            # Don't leave a partial upload behind
+            os.unlink(temp_file.name)
+            raise
+        return temp_file.name, digest.hexdigest()
+
+async def extract_uploaded_pdf_text(file: UploadFile) -> str:
+    """Save an uploaded PDF to a temporary file and extract its text.
+
+    Raises a 422 error if the PDF has no extractable text.
+    """
+    temp_file_path, file_hash = await save_upload_to_temp(file)
+    try:
+        # Skip extraction entirely when the same file was uploaded before
+        text = PDF_TEXT_CACHE.get(file_hash)
+        if text is None:
+            # Process PDF off the event loop
+            text = await asyncio.to_thread(process_pdf, temp_file_path)
+            PDF_TEXT_CACHE.set(file_hash, text)
+    finally:
+        # Clean up, whether or not extraction succeeded
+        os.unlink(temp_file_path)
+    
+    # Don't spend an LLM call on a PDF without a text layer
+    if not text.strip():
+        raise HTTPException(
+            status_code=422,
+            detail="PDF contains no extractable text (scanned image?). Run it through OCR and upload the result."
+        )
+    return text
+
 # FastAPI endpoints
 @app.post("/summarize")
 async def summarize_pdf(
     file: UploadFile = File(...),
-    summary_type: str = "summarize"
+    summary_type: str = "summarize",
+    max_tokens: int = Query(1000, ge=1, le=MAX_COMPLETION_TOKENS)
 ):
     """Endpoint to summarize, elaborate, or explain PDF content."""
     if not file.filename.endswith('.pdf'):
@@ -1005,33 +2279,27 @@ async def summarize_pdf(
         summary_type = "summarize"  # Default to summarize if invalid
     
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
-        # Process PDF
-        text = process_pdf(temp_file_path)
+        text = await extract_uploaded_pdf_text(file)
         docs = split_text(text)
         
         # Add the text to the vector store for future reference
-        add_to_vectorstore(text, metadata={"source": "pdf", "filename": file.filename})
+        await add_to_vectorstore(text, metadata={"source": "pdf", "filename": file.filename})
         
         # Process documents with the selected action
-        result = process_documents(
+        result = await process_documents(
             docs, 
-            summary_type
+            summary_type,
+            max_tokens
         )
         
-        # Clean up
-        os.unlink(temp_file_path)
-        
         return {
             "status": "success",
             "result": result
         }
         
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
     except Exception as e:
         import traceback
         error_message = f"Error: {str(e)}\n{traceback.format_exc()}"
@@ -1046,15 +2314,20 @@ async def summarize_text(request: TextSummaryRequest):
         summary_type = "summarize"  # Default to summarize if invalid
     else:
         summary_type = request.summary_type
+    
+    # Nothing to summarize; skip the LLM round-trip
+    if not request.text.strip():
+        raise HTTPException(status_code=422, detail="Text is empty")
         
     try:
         # Add the text to the vector store for future reference
-        add_to_vectorstore(request.text, metadata={"source": "text_input"})
+        await add_to_vectorstore(request.text, metadata={"source": "text_input"})
         
         # Process text with the selected action
-        result = process_text(
+        result = await process_text(
             request.text,
-            summary_type
+            summary_type,
+            request.max_tokens
         )
         
         return {
@@ -1068,42 +2341,110 @@ async def summarize_text(request: TextSummaryRequest):
         print(error_message)
         raise HTTPException(status_code=500, detail=error_message)
 
+@app.post("/summarize/stream")
+async def summarize_pdf_stream(
+    file: UploadFile = File(...),
+    summary_type: str = "summarize",
+    max_tokens: int = Query(1000, ge=1, le=MAX_COMPLETION_TOKENS)
+):
+    """Endpoint to stream the summary, elaboration, or explanation of PDF content as server-sent events."""
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    
+    # Validate summary_type
+    if summary_type not in ["summarize", "elaborate", "learn"]:
+        summary_type = "summarize"  # Default to summarize if invalid
+    
+    try:
+        text = await extract_uploaded_pdf_text(file)
+        docs = split_text(text)
+        
+        # Add the text to the vector store for future reference
+        await add_to_vectorstore(text, metadata={"source": "pdf", "filename": file.filename})
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
+    except Exception as e:
+        import traceback
+        error_message = f"Error: {str(e)}\n{traceback.format_exc()}"
+        print(error_message)
+        raise HTTPException(status_code=500, detail=error_message)
+    
+    return StreamingResponse(
+        stream_summary_events(docs, summary_type, max_tokens), media_type="text/event-stream"
+    )
+
+@app.post("/summarize-text/stream")
+async def summarize_text_stream(request: TextSummaryRequest):
+    """Endpoint to stream the summary, elaboration, or explanation of text content as server-sent events."""
+    # Validate summary_type
+    if request.summary_type not in ["summarize", "elaborate", "learn"]:
+        summary_type = "summarize"  # Default to summarize if invalid
+    else:
+        summary_type = request.summary_type
+    
+    # Nothing to summarize; skip the LLM round-trip
+    if not request.text.strip():
+        raise HTTPException(status_code=422, detail="Text is empty")
+    
+    # Add the text to the vector store for future reference
+    await add_to_vectorstore(request.text, metadata={"source": "text_input"})
+    
+    docs = split_text(request.text)
+    return StreamingResponse(
+        stream_summary_events(docs, summary_type, request.max_tokens), media_type="text/event-stream"
+    )
+
+async def start_chat_turn(request: ChatRequest) -> Tuple[ChatSession, bool]:
+    """Load or create the session for a chat request and add the user's message.
+
+    Returns the session and whether its title should be generated once the turn is saved.
+    """
+    session = None
+    
+    # Try to load existing session
+    if request.session_id:
+        session = await load_session(request.session_id)
+    
+    # Create new session if none exists
+    if not session:
+        session = await create_session()
+        if request.domain:
+            session.domain = request.domain
+    
+    # Add user message to session
+    session.messages.append(ChatMessage(role="user", content=request.message))
+    
+    # Title the session from its first message right away; the LLM-generated
+    # title replaces it in the background once the response has been sent
+    refine_title = len(session.messages) == 1 and session.title == "New Chat"
+    if refine_title:
+        session.title = provisional_session_title(request.message)
+    return session, refine_title
+
+async def finish_chat_turn(session: ChatSession, request: ChatRequest, response: str, refine_title: bool):
+    """Add the assistant's response to the session and save it."""
+    session.messages.append(ChatMessage(role="assistant", content=response))
+    await save_session(session)
+    if refine_title:
+        schedule_title_refinement(session.id, request.message, session.title)
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Process a chat message and return a response."""
     try:
-        session = None
-        
-        # Try to load existing session
-        if request.session_id:
-            session = load_session(request.session_id)
-        
-        # Create new session if none exists
-        if not session:
-            session = create_session()
-            if request.domain:
-                session.domain = request.domain
-        
-        # Add user message to session
-        session.messages.append(ChatMessage(role="user", content=request.message))
+        session, refine_title = await start_chat_turn(request)
         
         # Generate response
-        response = generate_chat_response(
+        response = await generate_chat_response(
             session=session,
             query=request.message,
             use_context=request.use_context,
             context_docs=request.context_docs
         )
         
-        # Add assistant response to session
-        session.messages.append(ChatMessage(role="assistant", content=response))
-        
-        # Update session title if this is the first user message
-        if len(session.messages) == 2:  # First user message + first assistant response
-            session.title = update_session_title(session)
-        
-        # Save the updated session
-        save_session(session)
+        # Add assistant response to session and save it
+        await finish_chat_turn(session, request, response, refine_title)
         
         # Return the response
         return ChatResponse(
@@ -1115,19 +2456,43 @@ async def chat(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Process a chat message and stream the response as server-sent events.
+
+    The first event carries the session id and title, then the response text
+    arrives as delta events and a final done event once the session is saved.
+    """
+    try:
+        session, refine_title = await start_chat_turn(request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
+    
+    async def events() -> AsyncIterator[str]:
+        parts = []
+        try:
+            yield sse_event({"session_id": session.id, "title": session.title})
+            async for part in stream_chat_response(
+                session=session,
+                query=request.message,
+                use_context=request.use_context,
+                context_docs=request.context_docs
+            ):
+                parts.append(part)
+                yield sse_event({"delta": part})
+            await finish_chat_turn(session, request, "".join(parts), refine_title)
+            yield sse_event({"done": True})
+        except Exception as e:
+            print(f"Chat streaming error: {e}")
+            yield sse_event({"error": str(e)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 @app.get("/chat/sessions", response_model=SessionListResponse)
 async def list_sessions():
     """List all chat sessions."""
     try:
-        sessions = get_all_sessions()
-        return SessionListResponse(
-            sessions=[{
-                "id": session.id,
-                "title": session.title,
-                "created_at": session.created_at,
-                "message_count": len(session.messages)
-            } for session in sessions]
-        )
+        return ORJSONResponse({"sessions": get_session_summaries()})
     except Exception as e:
         import traceback
         error_message = f"Error: {str(e)}\n{traceback.format_exc()}"
@@ -1137,27 +2502,41 @@ async def list_sessions():
 @app.get("/chat/session/{session_id}")
 async def get_session(session_id: str):
     """Get a specific chat session."""
-    session = load_session(session_id)
+    session = await load_session(session_id)
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
         
-    return session.dict()
+    return session.model_dump()
 
 @app.delete("/chat/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete a chat session."""
     session_path = get_session_path(session_id)
+    pending = PENDING_SESSION_SAVES.pop(session_id, None)
     
-    if not os.path.exists(session_path):
+    if pending is None and not os.path.exists(session_path):
         raise HTTPException(status_code=404, detail="Session not found")
         
     try:
-        os.remove(session_path)
+        DELETED_SESSIONS.add(session_id)
+        remove_session_files(session_id)
+        METADATA_INDEX.delete("sessions", session_id)
         return {"status": "success", "message": "Session deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting session: {str(e)}")
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Get hit/miss statistics for the in-memory caches."""
+    return {
+        "responses": RESPONSE_CACHE.stats(),
+        "pdf_text": PDF_TEXT_CACHE.stats(),
+        "embeddings": get_cached_embeddings().cache.stats(),
+        "search": SEARCH_CACHE.stats(),
+        "search_semantic": SEMANTIC_SEARCH_CACHE.stats(),
+    }
+
 @app.get("/")
 async def root():
     return {"message": "Exam Preparation & Learning Tool API is running"}
@@ -1180,46 +2559,52 @@ async def upload_exam_paper(
         if not file.content_type or 'application/pdf' not in file.content_type:
             print(f"Warning: Content type is not PDF: {file.content_type}")
         
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            # Write content to temp file
-            content = await file.read()
+        tmp_path = None
+        try:
+            # Stream the upload to a temporary file next to its final location, so
+            # it can be moved into place without copying
+            tmp_path, _ = await save_upload_to_temp(file, directory=EXAM_PAPERS_DIR)
+            size = os.path.getsize(tmp_path)
             
             # Check if file is empty
-            if len(content) == 0:
+            if size == 0:
                 raise HTTPException(status_code=400, detail="PDF file is empty")
                 
             # Check minimum size (20 bytes is arbitrary but helps catch obviously invalid files)
-            if len(content) < 20:
+            if size < 20:
                 raise HTTPException(status_code=400, detail="PDF file is too small and likely invalid")
-                
-            tmp.write(content)
-            tmp_path = tmp.name
-        
-        try:
-            # Verify it's a valid PDF by trying to load it
-            loader = PyPDFLoader(tmp_path)
-            # This will raise an error if the file is not a valid PDF
-            _ = loader.load()
-        except Exception as pdf_error:
-            # Clean up temp file
-            os.unlink(tmp_path)
-            raise HTTPException(status_code=400, detail=f"Invalid PDF file: {str(pdf_error)}")
-        
-        # Generate a unique ID for the paper
-        paper_id = str(uuid.uuid4())
-        
-        # Define file storage path
-        file_dir = os.path.join(EXAM_PAPERS_DIR, paper_id)
-        os.makedirs(file_dir, exist_ok=True)
-        
-        file_path = os.path.join(file_dir, file.filename)
-        
-        # Copy file to storage location
-        shutil.copy(tmp_path, file_path)
-        
-        # Clean up the temp file
-        os.unlink(tmp_path)
+            
+            # Cheap header check before handing the file to the parser
+            async with aiofiles.open(tmp_path, "rb") as f:
+                if await f.read(5) != b"%PDF-":
+                    raise HTTPException(status_code=400, detail="Invalid PDF file: missing PDF header")
+            
+            try:
+                # Parse the PDF once; this validates it and the result is reused for processing
+                preloaded_docs = await asyncio.get_running_loop().run_in_executor(
+                    get_pdf_pool(), load_and_split_pdf, tmp_path
+                )
+                if not preloaded_docs[0]:
+                    raise ValueError("PDF has no pages")
+            except Exception as pdf_error:
+                raise HTTPException(status_code=400, detail=f"Invalid PDF file: {str(pdf_error)}")
+            
+            # Generate a unique ID for the paper
+            paper_id = str(uuid.uuid4())
+            
+            # Define file storage path
+            file_dir = os.path.join(EXAM_PAPERS_DIR, paper_id)
+            os.makedirs(file_dir, exist_ok=True)
+            
+            file_path = os.path.join(file_dir, file.filename)
+            
+            # Move file to storage location
+            os.replace(tmp_path, file_path)
+            tmp_path = None
+        finally:
+            # Clean up the temp file on every other exit path
+            if tmp_path:
+                os.unlink(tmp_path)
         
         # Create metadata
         metadata = {
@@ -1232,11 +2617,11 @@ async def upload_exam_paper(
         }
         
         # Process the exam paper
-        processed_metadata = process_exam_paper(file_path, metadata)
+        processed_metadata = await process_exam_paper(file_path, metadata, preloaded_docs)
         
         # Create and save the ExamPaper object
         exam_paper = ExamPaper(**processed_metadata)
-        save_exam_paper(exam_paper)
+        await save_exam_paper(exam_paper)
         
         return exam_paper
         
@@ -1252,13 +2637,12 @@ async def upload_exam_paper(
 @app.get("/exam/papers", response_model=ExamPaperListResponse)
 async def list_exam_papers():
     """Get all exam papers."""
-    papers = get_all_exam_papers()
-    return {"papers": papers}
+    return indexed_json_response("exam_papers", key="papers")
 
 @app.get("/exam/paper/{paper_id}", response_model=ExamPaper)
 async def get_exam_paper(paper_id: str):
     """Get a specific exam paper."""
-    paper = load_exam_paper(paper_id)
+    paper = await load_exam_paper(paper_id)
     if not paper:
         raise HTTPException(status_code=404, detail="Exam paper not found")
     return paper
@@ -1273,7 +2657,7 @@ async def create_mindmap(request: MindMapRequest):
         print(f"Processing mindmap generation request for subject: {request.subject}, topic: {request.topic if request.topic else 'None'}")
         
         try:
-            mindmap = generate_mindmap(request.subject, request.topic)
+            mindmap = await generate_mindmap(request.subject, request.topic)
             return mindmap
         except Exception as specific_error:
             # If the error is coming from the mindmap generation function, it should already be
@@ -1298,7 +2682,7 @@ async def create_mindmap(request: MindMapRequest):
 @app.get("/mindmap/{mindmap_id}", response_model=MindMap)
 async def get_mindmap(mindmap_id: str):
     """Get a specific mindmap."""
-    mindmap = load_mindmap(mindmap_id)
+    mindmap = await load_mindmap(mindmap_id)
     if not mindmap:
         raise HTTPException(status_code=404, detail="Mindmap not found")
     return mindmap
@@ -1306,18 +2690,18 @@ async def get_mindmap(mindmap_id: str):
 @app.get("/mindmaps", response_model=List[MindMap])
 async def list_mindmaps():
     """Get all mindmaps."""
-    return get_all_mindmaps()
+    return indexed_json_response("mindmaps")
 
 @app.post("/analysis/generate", response_model=LearningModule)
 async def create_learning_module(request: AnalysisRequest):
     """Generate a learning module for a subject."""
-    module = generate_learning_module(request.subject, request.topic)
+    module = await generate_learning_module(request.subject, request.topic)
     return module
 
 @app.get("/analysis/{module_id}", response_model=LearningModule)
 async def get_learning_module(module_id: str):
     """Get a specific learning module."""
-    module = load_learning_module(module_id)
+    module = await load_learning_module(module_id)
     if not module:
         raise HTTPException(status_code=404, detail="Learning module not found")
     return module
@@ -1325,18 +2709,18 @@ async def get_learning_module(module_id: str):
 @app.get("/analyses", response_model=List[LearningModule])
 async def list_learning_modules():
     """Get all learning modules."""
-    return get_all_learning_modules()
+    return indexed_json_response("learning_modules")
 
 @app.post("/podcast/generate", response_model=Podcast)
 async def create_podcast(request: PodcastRequest):
     """Generate a podcast for a subject."""
-    podcast = generate_podcast_script(request.subject, request.topic, request.duration_minutes or 10)
+    podcast = await generate_podcast_script(request.subject, request.topic, request.duration_minutes or 10)
     return podcast
 
 @app.get("/podcast/{podcast_id}", response_model=Podcast)
 async def get_podcast(podcast_id: str):
     """Get a specific podcast."""
-    podcast = load_podcast(podcast_id)
+    podcast = await load_podcast(podcast_id)
     if not podcast:
         raise HTTPException(status_code=404, detail="Podcast not found")
     return podcast
@@ -1344,4 +2728,4 @@ async def get_podcast(podcast_id: str):
 @app.get("/podcasts", response_model=List[Podcast])
 async def list_podcasts():
     """Get all podcasts."""
-    return get_all_podcasts() 
\ No newline at end of file
+    return indexed_json_response("podcasts")
\ No newline at end of file
@@ -0,0 +1,90 @@
+import mmap
+import os
+from typing import Optional, Tuple
+
+# Bitrates in kbit/s by bitrate index, for (MPEG-1, layer) and (MPEG-2/2.5, layer)
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates by version bits: MPEG-2.5, reserved, MPEG-2, MPEG-1
+_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
+def _frame_info(b1: int, b2: int, b3: int) -> Optional[Tuple[int, int, int, int]]:
+    """Parse the three bytes after a frame sync byte.
+
+    Returns (frame length, samples per frame, sample rate, Xing header offset), or
+    None if they are not a valid MPEG audio frame header.
+    """
+    if b1 & 0xE0 != 0xE0:
+        return None
+    version = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(1 if mpeg1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+
+    # A Xing/Info header sits after the side information of the first frame
+    mono = (b3 >> 6) == 3
+    xing_offset = 4 + ((17 if mono else 32) if mpeg1 else (9 if mono else 17))
+    return length, samples, sample_rate, xing_offset
+
+def mp3_duration(data) -> float:
+    """Return the duration in seconds of the MPEG audio frames in data.
+
+    Only frame headers are read; nothing is decoded. ID3v2 tags are skipped wherever
+    they appear, so files made by concatenating MP3s are handled, and Xing/Info
+    header frames are not counted as audio. Bytes that are not part of a frame are
+    skipped until the next frame header.
+    """
+    size = len(data)
+    pos = 0
+    seconds = 0.0
+    while pos + 4 <= size:
+        if data[pos:pos + 3] == b"ID3" and pos + 10 <= size:
+            tag_size = (data[pos + 6] << 21) | (data[pos + 7] << 14) | (data[pos + 8] << 7) | data[pos + 9]
+            footer = 10 if data[pos + 5] & 0x10 else 0
+            pos += 10 + tag_size + footer
+            continue
+
+        info = _frame_info(data[pos + 1], data[pos + 2], data[pos + 3]) if data[pos] == 0xFF else None
+        if info is None:
+            pos += 1
+            continue
+        length, samples, sample_rate, xing_offset = info
+        if pos + length > size:
+            # Truncated final frame
+            break
+        if data[pos + xing_offset:pos + xing_offset + 4] not in (b"Xing", b"Info"):
+            seconds += samples / sample_rate
+        pos += length
+    return seconds
+
+def mp3_file_duration(path: str) -> float:
+    """Return the duration in seconds of an MP3 file, reading it through mmap."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0.0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return mp3_duration(data)
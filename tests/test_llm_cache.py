@@ -0,0 +1,86 @@
+import asyncio
+import os
+import string
+import sys
+import tempfile
+import unittest
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from llm_cache import SemanticCache
+
+main = None
+
+def setUpModule():
+    global main
+    if "main" not in sys.modules:
+        # main creates its data directories in the working directory on import
+        os.chdir(tempfile.mkdtemp())
+    import main as main_module
+    main = main_module
+
+class LetterEmbeddings(Embeddings):
+    """Letter counts, so texts that share most of their letters are similar."""
+
+    def embed_query(self, text: str) -> List[float]:
+        text = text.lower()
+        return [float(text.count(letter)) + 0.01 for letter in string.ascii_lowercase]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+class ArtifactCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = SemanticCache(tempfile.mkdtemp(), LetterEmbeddings())
+        self.get_semantic_cache = main.get_semantic_cache
+        main.get_semantic_cache = lambda: self.cache
+
+    def tearDown(self):
+        main.get_semantic_cache = self.get_semantic_cache
+
+    def lookup(self, kind, subject, topic, **params):
+        async def loader(artifact_id):
+            return artifact_id
+        return asyncio.run(main.lookup_cached_artifact(kind, subject, topic, loader, **params))
+
+    def store(self, kind, subject, topic, artifact_id, **params):
+        asyncio.run(main.cache_artifact(kind, subject, topic, artifact_id, **params))
+
+    def test_exact_request(self):
+        self.store("mindmap", "Calculus", "Derivatives", "m1")
+        self.store("mindmap", "Calculus", None, "m2")
+        self.assertEqual(self.lookup("mindmap", "  calculus ", "Derivatives"), "m1")
+        self.assertEqual(self.lookup("mindmap", "Calculus", None), "m2")
+        self.assertEqual(self.lookup("mindmap", "Calculus", ""), "m2")
+        # Other kinds and parameters don't match
+        self.assertIsNone(self.lookup("module", "Calculus", "Derivatives"))
+        self.store("podcast", "Calculus", "Derivatives", "p1", duration_minutes=10)
+        self.assertEqual(self.lookup("podcast", "Calculus", "Derivatives", duration_minutes=10), "p1")
+        self.assertIsNone(self.lookup("podcast", "Calculus", "Derivatives", duration_minutes=5))
+
+    def test_similar_topic(self):
+        self.store("module", "Calculus", "Derivatives", "m1")
+        self.assertEqual(self.lookup("module", "Calculus", "derivative"), "m1")
+        self.assertIsNone(self.lookup("module", "Calculus", "Integrals"))
+
+    def test_subject_and_topic_presence_match_exactly(self):
+        self.store("mindmap", "Calculus", "Derivatives", "m1")
+        self.assertIsNone(self.lookup("mindmap", "Calculus", None))
+        self.assertIsNone(self.lookup("mindmap", "Organic Chemistry", "Derivatives"))
+        self.store("mindmap", "Calculus", None, "m2")
+        self.assertIsNone(self.lookup("mindmap", "Calculus", "Calculus"))
+
+    def test_cached_artifact_that_no_longer_exists(self):
+        self.store("mindmap", "Calculus", "Derivatives", "missing")
+        result = asyncio.run(
+            main.lookup_cached_artifact("mindmap", "Calculus", "Derivatives", main.load_mindmap)
+        )
+        self.assertIsNone(result)
+
+if __name__ == "__main__":
+    unittest.main()
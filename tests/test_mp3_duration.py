@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mp3_duration import mp3_duration, mp3_file_duration
+
+# MPEG-1 Layer III, 128 kbit/s, 44100 Hz, stereo: 417 bytes and 1152 samples per frame
+MPEG1_HEADER = bytes([0xFF, 0xFB, 0x90, 0x00])
+MPEG1_LENGTH = 417
+MPEG1_SECONDS = 1152 / 44100
+
+# MPEG-2 Layer III, 64 kbit/s, 22050 Hz, stereo: 208 bytes and 576 samples per frame
+MPEG2_HEADER = bytes([0xFF, 0xF3, 0x80, 0x00])
+MPEG2_LENGTH = 208
+MPEG2_SECONDS = 576 / 22050
+
+def frame(header: bytes, length: int, payload: bytes = b"") -> bytes:
+    return (header + payload).ljust(length, b"\0")
+
+def mpeg1_frames(count: int) -> bytes:
+    return frame(MPEG1_HEADER, MPEG1_LENGTH) * count
+
+def id3_tag(body: bytes) -> bytes:
+    size = len(body)
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + syncsafe + body
+
+class Mp3DurationTest(unittest.TestCase):
+    def test_mpeg1_layer3(self):
+        self.assertAlmostEqual(mp3_duration(mpeg1_frames(100)), 100 * MPEG1_SECONDS)
+
+    def test_mpeg2_half_sample_frames(self):
+        data = frame(MPEG2_HEADER, MPEG2_LENGTH) * 50
+        self.assertAlmostEqual(mp3_duration(data), 50 * MPEG2_SECONDS)
+
+    def test_id3_tags_between_concatenated_parts(self):
+        # The tag body contains a frame sync, which must not be read as audio
+        tag = id3_tag(b"\xFF\xFB\x90\x00" + b"\0" * 300)
+        data = tag + mpeg1_frames(10) + tag + mpeg1_frames(20)
+        self.assertAlmostEqual(mp3_duration(data), 30 * MPEG1_SECONDS)
+
+    def test_xing_and_info_frames_are_not_audio(self):
+        # In an MPEG-1 stereo frame the Xing/Info header follows 32 bytes of side information
+        for tag in (b"Xing", b"Info"):
+            with self.subTest(tag=tag):
+                header_frame = frame(MPEG1_HEADER, MPEG1_LENGTH, b"\0" * 32 + tag)
+                data = header_frame + mpeg1_frames(10)
+                self.assertAlmostEqual(mp3_duration(data), 10 * MPEG1_SECONDS)
+
+    def test_truncated_last_frame(self):
+        data = mpeg1_frames(10) + MPEG1_HEADER + b"\0" * 100
+        self.assertAlmostEqual(mp3_duration(data), 10 * MPEG1_SECONDS)
+
+    def test_garbage_between_frames(self):
+        data = b"junk" + mpeg1_frames(5) + b"\x00\x01\x02" + mpeg1_frames(5)
+        self.assertAlmostEqual(mp3_duration(data), 10 * MPEG1_SECONDS)
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "audio.mp3")
+            with open(path, "wb") as f:
+                f.write(id3_tag(b"\0" * 20) + mpeg1_frames(40))
+            self.assertAlmostEqual(mp3_file_duration(path), 40 * MPEG1_SECONDS)
+
+            empty_path = os.path.join(directory, "empty.mp3")
+            open(empty_path, "wb").close()
+            self.assertEqual(mp3_file_duration(empty_path), 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
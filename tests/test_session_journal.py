@@ -0,0 +1,175 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+main = None
+
+def setUpModule():
+    global main
+    if "main" not in sys.modules:
+        # main creates its data directories in the working directory on import
+        os.chdir(tempfile.mkdtemp())
+    import main as main_module
+    main = main_module
+
+class SessionJournalTest(unittest.TestCase):
+    def setUp(self):
+        main.PERSISTED_SESSIONS.clear()
+        main.PENDING_SESSION_SAVES.clear()
+
+    def reload(self, session_id):
+        main.PERSISTED_SESSIONS.clear()
+        main.PENDING_SESSION_SAVES.clear()
+        return asyncio.run(main.load_session(session_id))
+
+    def run_concurrent_turns(self, session, turns):
+        """Write the session while chat turns keep appending to it, as the writer does."""
+        async def chat_turns():
+            for i in range(turns):
+                session.messages.append(main.ChatMessage(role="user", content=f"question {i}"))
+                await asyncio.sleep(0.01)
+                session.messages.append(main.ChatMessage(role="assistant", content=f"answer {i}"))
+                await asyncio.sleep(0.01)
+
+        async def writes():
+            while not turns_done.done():
+                await main.write_session(session)
+                await asyncio.sleep(0)
+            await main.write_session(session)
+
+        async def run():
+            nonlocal turns_done
+            turns_done = asyncio.ensure_future(chat_turns())
+            await asyncio.gather(turns_done, writes())
+
+        turns_done = None
+        asyncio.run(run())
+
+    def slow(self, func):
+        def wrapper(*args, **kwargs):
+            time.sleep(0.015)
+            return func(*args, **kwargs)
+        return wrapper
+
+    def test_journal_keeps_messages_added_during_write(self):
+        session = main.ChatSession(messages=[main.ChatMessage(role="user", content="hello")])
+        asyncio.run(main.write_session(session))
+
+        append_to_file = main.append_to_file
+        main.append_to_file = self.slow(append_to_file)
+        try:
+            self.run_concurrent_turns(session, 5)
+        finally:
+            main.append_to_file = append_to_file
+
+        loaded = self.reload(session.id)
+        self.assertEqual(
+            [m.content for m in loaded.messages],
+            [m.content for m in session.messages],
+        )
+
+    def test_snapshot_keeps_messages_added_during_write(self):
+        session = main.ChatSession(messages=[main.ChatMessage(role="user", content="hello")])
+
+        write_json_model = main.write_json_model
+        async def slow_write_json_model(file_path, model):
+            await asyncio.sleep(0.015)
+            await write_json_model(file_path, model)
+        main.write_json_model = slow_write_json_model
+        try:
+            # No persisted state yet, so the first write is a snapshot
+            self.run_concurrent_turns(session, 5)
+        finally:
+            main.write_json_model = write_json_model
+
+        loaded = self.reload(session.id)
+        self.assertEqual(
+            [m.content for m in loaded.messages],
+            [m.content for m in session.messages],
+        )
+
+    def test_writer_writes_saves_made_during_a_write(self):
+        session = main.ChatSession(messages=[main.ChatMessage(role="user", content="hello")])
+
+        write_json_model = main.write_json_model
+        async def slow_write_json_model(file_path, model):
+            await asyncio.sleep(0.05)
+            await write_json_model(file_path, model)
+
+        async def run():
+            main.SESSION_WRITE_QUEUE = asyncio.Queue()
+            writer = asyncio.create_task(main.session_writer())
+            first_save = asyncio.create_task(main.save_session(session))
+            await asyncio.sleep(0.01)
+            # The first write is still in progress
+            self.assertFalse(first_save.done())
+            self.assertIs(await main.load_session(session.id), session)
+            session.messages.append(main.ChatMessage(role="assistant", content="hi"))
+            await main.save_session(session)
+            # Both saves return once the message added during the first write is on disk
+            self.assertTrue(first_save.done())
+            self.assertTrue(main.session_is_persisted(session))
+            await main.SESSION_WRITE_QUEUE.join()
+            writer.cancel()
+
+        main.write_json_model = slow_write_json_model
+        try:
+            asyncio.run(run())
+        finally:
+            main.write_json_model = write_json_model
+
+        self.assertNotIn(session.id, main.PENDING_SESSION_SAVES)
+        loaded = self.reload(session.id)
+        self.assertEqual([m.content for m in loaded.messages], ["hello", "hi"])
+
+    def test_delete_during_write_removes_the_session(self):
+        write_json_model = main.write_json_model
+        async def slow_write_json_model(file_path, model):
+            await asyncio.sleep(0.05)
+            await write_json_model(file_path, model)
+
+        append_to_file = main.append_to_file
+
+        async def save_then_delete(session):
+            main.SESSION_WRITE_QUEUE = asyncio.Queue()
+            writer = asyncio.create_task(main.session_writer())
+            save = asyncio.create_task(main.save_session(session))
+            await asyncio.sleep(0.01)
+            # The write is still in progress
+            await main.delete_session(session.id)
+            # A chat turn that was still running saves the session again
+            session.messages.append(main.ChatMessage(role="assistant", content="hi"))
+            await main.save_session(session)
+            await asyncio.wait_for(save, 5)
+            await main.SESSION_WRITE_QUEUE.join()
+            writer.cancel()
+
+        for journaled in (False, True):
+            with self.subTest(journaled=journaled):
+                session = main.ChatSession(messages=[main.ChatMessage(role="user", content="hello")])
+                if journaled:
+                    # Already on disk, so the next write appends to the journal
+                    asyncio.run(main.write_session(session))
+                    session.messages.append(main.ChatMessage(role="user", content="again"))
+                main.write_json_model = slow_write_json_model
+                main.append_to_file = self.slow(append_to_file)
+                try:
+                    asyncio.run(save_then_delete(session))
+                finally:
+                    main.write_json_model = write_json_model
+                    main.append_to_file = append_to_file
+
+                self.assertFalse(os.path.exists(main.get_session_path(session.id)))
+                self.assertFalse(os.path.exists(main.get_session_log_path(session.id)))
+                self.assertNotIn(session.id, main.PENDING_SESSION_SAVES)
+                self.assertIsNone(self.reload(session.id))
+
+if __name__ == "__main__":
+    unittest.main()